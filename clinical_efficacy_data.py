@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Clinical efficacy record shared by the simple (non-LLM) CMML extraction scripts
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List
+
+@dataclass(slots=True)
+class ClinicalEfficacyData:
+    pmid: str
+    citation: str
+    url: str
+    drug: str
+
+    # Efficacy metrics
+    complete_response: Optional[float] = None
+    partial_response: Optional[float] = None
+    marrow_complete_response: Optional[float] = None
+    overall_response_rate: Optional[float] = None
+
+    # Survival metrics
+    progression_free_survival_median: Optional[float] = None
+    overall_survival_median: Optional[float] = None
+
+    # Study details
+    total_patients: Optional[int] = None
+    cmml_patients: Optional[int] = None
+
+    # Metadata
+    supporting_quotes: List[str] = None
+    data_source_location: str = ""
+    extraction_confidence: Optional[float] = None
+    efficacy_summary: str = ""
+    has_efficacy_data: bool = False
+
+    def __post_init__(self):
+        if self.supporting_quotes is None:
+            self.supporting_quotes = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Shallow field dict; no nested dataclasses, so asdict's deep copy is not needed"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_study(cls, study: Dict[str, Any], drug: str, **fields) -> 'ClinicalEfficacyData':
+        """Build a record whose pmid/citation/url come from the study dict"""
+        pmid = study.get('pmid', '')
+        url = study.get('url')
+        if url is None:
+            # Only build the PubMed link when the study does not carry one
+            url = "https://pubmed.ncbi.nlm.nih.gov/" + str(pmid) + "/"
+        return cls(pmid=pmid, citation=study.get('citation', ''), url=url, drug=drug, **fields)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Shared in-memory copy of updated_dashboard_data.json
+The fix_* scripts mutate the dict returned by load() and call save() once at the end,
+so running several of them in one process parses and writes the file only once
+"""
+
+import os
+import orjson
+
+DASHBOARD_FILE = 'updated_dashboard_data.json'
+
+_dashboard = None
+
+def load() -> dict:
+    """Return the dashboard data, reading the file on first use only"""
+    global _dashboard
+    if _dashboard is None:
+        with open(DASHBOARD_FILE, 'rb') as f:
+            _dashboard = orjson.loads(f.read())
+    return _dashboard
+
+def save():
+    """Write the dashboard data back if it was loaded"""
+    if _dashboard is None:
+        return
+    tmp_path = DASHBOARD_FILE + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(_dashboard, option=orjson.OPT_INDENT_2))
+    # Atomic rename so an interrupted run never leaves a half-written dashboard
+    os.replace(tmp_path, DASHBOARD_FILE)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Paper loading, duplicate detection and JSON Lines checkpoints shared by the
+clinical efficacy extractors (extract_clinical_efficacy_working/_enhanced)
+"""
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, Dict, List
+import msgspec
+
+MAX_SUPPORTING_QUOTES = 5
+MAX_QUOTE_LENGTH = 500
+
+# data_source_location of a record whose extraction failed; never reused for a duplicate
+EXTRACTION_FAILED = "Extraction failed"
+
+# Studies with none of these terms cannot yield CMML-specific data, so Gemini is not called
+CMML_PATTERN = re.compile(r'cmml|chronic myelomonocytic|myelomonocytic leuka?emia', re.IGNORECASE)
+
+class Paper(msgspec.Struct):
+    """PubMed record fields used by the extractors; other keys are skipped while decoding"""
+    pmid: str
+    title: str = ''
+    abstract: str = ''
+    citation: str = ''
+    drug: str = ''
+    url: str = ''
+
+    def pubmed_url(self) -> str:
+        return self.url or "https://pubmed.ncbi.nlm.nih.gov/" + self.pmid + "/"
+
+def bound_quotes(quotes) -> List[str]:
+    """Bound LLM-supplied quotes so a verbose response can't bloat every checkpoint"""
+    quotes = quotes or []
+    if isinstance(quotes, str):
+        quotes = [quotes]
+    return [str(q)[:MAX_QUOTE_LENGTH] for q in quotes[:MAX_SUPPORTING_QUOTES]]
+
+def load_papers(drug: str, path: str = 'pubmed_all_cmml_papers.json') -> List[Paper]:
+    """Decode only `drug`'s papers from the corpus; other drugs are never materialized"""
+    corpus_type = msgspec.defstruct('Corpus', [(drug, List[Paper], [])])
+    with open(path, 'rb') as f:
+        corpus = msgspec.json.decode(f.read(), type=corpus_type)
+    return getattr(corpus, drug)
+
+def abstract_key(study: Paper) -> bytes:
+    """Content key used to detect duplicate abstracts (errata, reprints)"""
+    text = study.title + study.abstract
+    return hashlib.sha1(text.encode()).digest()
+
+def extractions_by_key(papers: List[Paper], results: list) -> Dict[bytes, msgspec.Struct]:
+    """Successful checkpointed extractions keyed by abstract, for duplicates later in the run"""
+    extracted = {}
+    for paper, result in zip(papers, results):
+        if result.data_source_location != EXTRACTION_FAILED:
+            extracted[abstract_key(paper)] = result
+    return extracted
+
+def reuse_extraction(record: msgspec.Struct, paper: Paper) -> msgspec.Struct:
+    """Copy of a duplicate abstract's extraction carrying this paper's own identifiers"""
+    return msgspec.structs.replace(record, pmid=paper.pmid, citation=paper.citation, url=paper.pubmed_url())
+
+def load_checkpoint(path: str, record_type: type) -> list:
+    """Read the append-only JSON Lines checkpoint, truncating a torn final line"""
+    results = []
+    valid_bytes = 0
+    with open(path, 'r+b') as f:
+        for line in f:
+            try:
+                results.append(record_type(**msgspec.json.decode(line)))
+            except msgspec.DecodeError:
+                break
+            valid_bytes += len(line)
+        f.truncate(valid_bytes)
+    return results
+
+def migrate_legacy_checkpoint(legacy_path: str, path: str):
+    """Convert an old whole-file JSON checkpoint to the JSON Lines format"""
+    with open(legacy_path, 'r') as f:
+        records = json.load(f)
+    # Written aside and renamed so a failed migration never leaves a partial checkpoint
+    with open(path + '.tmp', 'wb') as f:
+        for record in records:
+            f.write(msgspec.json.encode(record) + b'\n')
+    os.replace(path + '.tmp', path)
+
+def resume_checkpoint(path: str, legacy_path: str, record_type: type) -> list:
+    """Records already extracted into `path` (migrating `legacy_path` first), or [] to start fresh"""
+    try:
+        if not os.path.exists(path) and os.path.exists(legacy_path):
+            migrate_legacy_checkpoint(legacy_path, path)
+        if os.path.exists(path):
+            return load_checkpoint(path, record_type)
+    except (json.JSONDecodeError, msgspec.DecodeError, msgspec.ValidationError) as e:
+        # Keep the unreadable file for inspection instead of overwriting finished work
+        corrupt_path = path if os.path.exists(path) else legacy_path
+        os.replace(corrupt_path, corrupt_path + '.corrupt')
+        print("Checkpoint file corrupted (" + str(e) + "), moved to " + corrupt_path + ".corrupt; starting fresh")
+    return []
+
+def efficacy_share(with_efficacy: int, total: int) -> str:
+    """"n/total (pct%)" for the summary, safe for a drug with no papers"""
+    if total == 0:
+        return "0/0 (0%)"
+    return str(with_efficacy) + "/" + str(total) + " (" + str(round(with_efficacy / total * 100, 1)) + "%)"
+
+def run_all(main: Callable[[str, int], None], drugs: List[str]):
+    """Run main(drug, workers) for each drug in parallel worker processes"""
+    # Each worker gets its own Gemini client, checkpoint and output file; they all
+    # share one API key, so each paces itself to an equal slice of the rate
+    with ProcessPoolExecutor(max_workers=len(drugs), mp_context=get_context('spawn')) as executor:
+        list(executor.map(main, drugs, [len(drugs)] * len(drugs)))
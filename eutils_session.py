@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Pooled requests session and NCBI rate settings shared by the PubMed E-utilities fetch scripts
+"""
+
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Optional NCBI API key raises the E-utilities limit from 3 to 10 requests/second
+# (requests drops None-valued params, so the key is only sent when set)
+NCBI_API_KEY = os.environ.get('NCBI_API_KEY')
+NCBI_RATE = 10 if NCBI_API_KEY else 3
+
+# Pause between sequential requests, with 5% headroom under NCBI_RATE
+REQUEST_DELAY = 1.05 / NCBI_RATE
+
+def new_session() -> requests.Session:
+    """Keep-alive session for eutils.ncbi.nlm.nih.gov with gzip and retried throttling/5xx"""
+    session = requests.Session()
+    session.headers.update({'User-Agent': 'CMML_Research', 'Accept-Encoding': 'gzip'})
+    session.mount('https://', HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=['GET', 'POST'])
+    ))
+    return session
+
+# One session per process, so the TLS handshake to eutils.ncbi.nlm.nih.gov is paid once
+SESSION = new_session()
@@ -6,18 +6,34 @@ Improved prompts to capture PFS, therapy duration, and comprehensive adverse eve
 
 import json
 import os
-import time
+import sys
 import google.generativeai as genai
+import msgspec
+from google.api_core.exceptions import ResourceExhausted
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 from datetime import datetime
-from dataclasses import dataclass, asdict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional
+from rate_limiter import RateLimiter
+from efficacy_extraction import (CMML_PATTERN, EXTRACTION_FAILED, Paper, abstract_key, bound_quotes, efficacy_share,
+                                 extractions_by_key, load_papers, resume_checkpoint, reuse_extraction, run_all)
 
 # Configure Gemini API
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
 model = genai.GenerativeModel('gemini-1.5-flash')
+# Gemini requests/minute allowed for the API key; parallel workers split it between them
+GEMINI_RATE = 60
+rate_limiter = RateLimiter(GEMINI_RATE, 60)
 
-@dataclass
-class EnhancedClinicalEfficacyData:
+@retry(retry=retry_if_exception_type(ResourceExhausted),
+       wait=wait_random_exponential(multiplier=1, max=60),
+       stop=stop_after_attempt(6),
+       reraise=True)
+def generate_content(prompt: str):
+    """Call Gemini, backing off on transient 429 (ResourceExhausted) responses"""
+    rate_limiter.acquire()
+    return model.generate_content(prompt)
+
+class EnhancedClinicalEfficacyData(msgspec.Struct):
     pmid: str
     citation: str
     url: str
@@ -65,26 +81,18 @@ class EnhancedClinicalEfficacyData:
     has_efficacy_data: bool = False
     
     def __post_init__(self):
-        if self.supporting_quotes is None:
-            self.supporting_quotes = []
+        self.supporting_quotes = bound_quotes(self.supporting_quotes)
 
-def extract_enhanced_clinical_efficacy(study: Dict[str, Any]) -> EnhancedClinicalEfficacyData:
-    """Extract enhanced clinical efficacy data with improved prompts"""
-    
-    pmid = study.get('pmid', '')
-    title = study.get('title', '')
-    abstract = study.get('abstract', '')
-    url = study.get('url', "https://pubmed.ncbi.nlm.nih.gov/" + str(pmid) + "/")
-    
-    text_to_analyze = "Title: " + str(title) + "\n\nAbstract: " + str(abstract)
-    
-    # Enhanced prompt with specific focus on CMML-only data
-    prompt = """You are a medical data extraction specialist. Analyze the following clinical study text and extract comprehensive clinical efficacy data for CMML (Chronic Myelomonocytic Leukemia) treatment ONLY.
+# Static prompt text is built once at import; only the study text varies per call
+# Enhanced prompt with specific focus on CMML-only data
+PROMPT_PREFIX = """You are a medical data extraction specialist. Analyze the following clinical study text and extract comprehensive clinical efficacy data for CMML (Chronic Myelomonocytic Leukemia) treatment ONLY.
 
 CRITICAL: This study must contain CMML-specific data. If the study only contains data for MDS (Myelodysplastic Syndrome) or MPS/MPD (Myeloproliferative Syndrome/Disorder) without CMML patients, mark has_efficacy_data as false.
 
 STUDY TEXT:
-""" + text_to_analyze + """
+"""
+
+PROMPT_SUFFIX = """
 
 EXTRACTION REQUIREMENTS:
 1. **CMML-SPECIFIC DATA VERIFICATION**:
@@ -161,8 +169,32 @@ OUTPUT FORMAT (JSON):
   "extraction_confidence": <0-100>
 }"""
 
+def extract_enhanced_clinical_efficacy(study: Paper, drug: str = 'azacitidine') -> EnhancedClinicalEfficacyData:
+    """Extract enhanced clinical efficacy data with improved prompts"""
+    
+    pmid = study.pmid
+    title = study.title
+    abstract = study.abstract
+    url = study.pubmed_url()
+    
+    text_to_analyze = "Title: " + title + "\n\nAbstract: " + abstract
+    
+    if not CMML_PATTERN.search(text_to_analyze):
+        print("    ⏭️  No CMML terms in title/abstract, skipping Gemini call")
+        return EnhancedClinicalEfficacyData(
+            pmid=pmid,
+            citation=study.citation,
+            url=url,
+            drug=study.drug or drug,
+            efficacy_summary="No CMML terms in title/abstract",
+            has_efficacy_data=False,
+            extraction_confidence=0
+        )
+    
+    prompt = "".join((PROMPT_PREFIX, text_to_analyze, PROMPT_SUFFIX))
+
     try:
-        response = model.generate_content(prompt)
+        response = generate_content(prompt)
         response_text = response.text.strip()
         
         # Extract JSON from response - more robust parsing
@@ -189,9 +221,9 @@ OUTPUT FORMAT (JSON):
         # Create EnhancedClinicalEfficacyData object
         efficacy_data = EnhancedClinicalEfficacyData(
             pmid=pmid,
-            citation=study.get('citation', ''),
+            citation=study.citation,
             url=url,
-            drug=study.get('drug', 'azacitidine'),
+            drug=study.drug or drug,
             complete_response=extracted_data.get('complete_response'),
             partial_response=extracted_data.get('partial_response'),
             marrow_complete_response=extracted_data.get('marrow_complete_response'),
@@ -224,51 +256,71 @@ OUTPUT FORMAT (JSON):
         
         return efficacy_data
         
+    except ResourceExhausted:
+        # Retries exhausted: let main() stop the run and keep the checkpoint
+        raise
     except Exception as e:
         print("    ✗ Error: " + str(e))
-        # Return empty data structure
+        # Return empty data structure, marked so it is never reused for a duplicate abstract
         return EnhancedClinicalEfficacyData(
             pmid=pmid,
-            citation=study.get('citation', ''),
+            citation=study.citation,
             url=url,
-            drug=study.get('drug', 'azacitidine'),
+            drug=study.drug or drug,
+            data_source_location=EXTRACTION_FAILED,
+            efficacy_summary=str(e),
             has_efficacy_data=False,
             extraction_confidence=0
         )
 
-def main():
-    """Main extraction function"""
-    print("🔍 Loading azacitidine papers...")
+def main(drug: str = 'azacitidine', workers: int = 1):
+    """Main extraction function for a single drug"""
+    global rate_limiter
+    if workers > 1:
+        rate_limiter = RateLimiter(GEMINI_RATE / workers, 60)
     
-    # Load papers
-    with open('pubmed_all_cmml_papers.json', 'r') as f:
-        all_papers = json.load(f)
+    print(f"🔍 Loading {drug} papers...")
     
-    azacitidine_papers = all_papers.get('azacitidine', [])
-    print(f"✅ Loaded {len(azacitidine_papers)} azacitidine papers")
-    
-    # Load checkpoint if exists
-    checkpoint_file = 'clinical_efficacy_azacitidine_enhanced_checkpoint.json'
-    results = []
-    start_index = 0
+    # Load papers
+    drug_papers = load_papers(drug)
+    print(f"✅ Loaded {len(drug_papers)} {drug} papers")
     
-    if os.path.exists(checkpoint_file):
-        with open(checkpoint_file, 'r') as f:
-            results = json.load(f)
-        start_index = len(results)
+    # Load checkpoint if exists (records are appended one per line as they are extracted)
+    checkpoint_file = f'clinical_efficacy_{drug}_enhanced_checkpoint.jsonl'
+    legacy_checkpoint_file = f'clinical_efficacy_{drug}_enhanced_checkpoint.json'
+    results = resume_checkpoint(checkpoint_file, legacy_checkpoint_file, EnhancedClinicalEfficacyData)
+    start_index = len(results)
+    if start_index:
         print(f"📂 Resuming from checkpoint: {start_index} papers already processed")
+    checkpoint = open(checkpoint_file, 'ab')
+    
+    # Papers sharing title+abstract are sent to Gemini once; the result is fanned out per PMID
+    unique_abstracts = len({abstract_key(p) for p in drug_papers})
+    if unique_abstracts < len(drug_papers):
+        print(f"🔁 {len(drug_papers) - unique_abstracts} duplicate abstracts will reuse earlier extractions")
+    extracted_by_key = extractions_by_key(drug_papers, results)
     
     # Process papers
     requests_today = 0
     with_efficacy = 0
     
-    for i, paper in enumerate(azacitidine_papers[start_index:], start_index + 1):
-        print(f"📄 Processing paper {i}/{len(azacitidine_papers)}: PMID {paper.get('pmid', 'N/A')}")
+    for i, paper in enumerate(drug_papers[start_index:], start_index + 1):
+        print(f"📄 Processing paper {i}/{len(drug_papers)}: PMID {paper.pmid}")
         
         try:
-            efficacy_data = extract_enhanced_clinical_efficacy(paper)
-            results.append(asdict(efficacy_data))
-            requests_today += 1
+            key = abstract_key(paper)
+            reused = key in extracted_by_key
+            if reused:
+                efficacy_data = reuse_extraction(extracted_by_key[key], paper)
+                print(f"    🔁 Duplicate abstract, reusing extraction from PMID {extracted_by_key[key].pmid}")
+            else:
+                efficacy_data = extract_enhanced_clinical_efficacy(paper, drug)
+                if efficacy_data.data_source_location != EXTRACTION_FAILED:
+                    extracted_by_key[key] = efficacy_data
+                requests_today += 1
+            results.append(efficacy_data)
+            checkpoint.write(msgspec.json.encode(efficacy_data) + b'\n')
+            checkpoint.flush()
             
             if efficacy_data.has_efficacy_data:
                 with_efficacy += 1
@@ -276,24 +328,18 @@ def main():
             else:
                 print(f"    ⚠️  No efficacy data found")
             
-            # Save checkpoint every 10 papers
             if i % 10 == 0:
-                with open(checkpoint_file, 'w') as f:
-                    json.dump(results, f, indent=2)
-                print(f"💾 Checkpoint saved: {len(results)} papers processed")
-            
-            # Rate limiting
-            time.sleep(1)
+                print(f"💾 Checkpoint: {len(results)} papers processed")
             
         except Exception as e:
             error_str = str(e)
             print("    ✗ Error: " + error_str)
             
             # Check if this is an API quota error
-            if "quota" in error_str.lower() or "limit" in error_str.lower() or "429" in error_str:
+            if isinstance(e, ResourceExhausted) or "quota" in error_str.lower() or "limit" in error_str.lower() or "429" in error_str:
                 print("\n" + "="*60)
                 print("*** API QUOTA LIMIT REACHED ***")
-                print("Stopped at paper " + str(i) + "/" + str(len(azacitidine_papers)))
+                print("Stopped at paper " + str(i) + "/" + str(len(drug_papers)))
                 print("Total requests made: " + str(requests_today))
                 print("Papers processed successfully: " + str(len(results)))
                 print("="*60)
@@ -301,28 +347,29 @@ def main():
             else:
                 # Continue with next paper for other errors
                 continue
+    checkpoint.close()
     
     # Save final results
-    output_file = 'clinical_efficacy_azacitidine_enhanced.json'
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    output_file = f'clinical_efficacy_{drug}_enhanced.json'
+    with open(output_file, 'wb') as f:
+        f.write(msgspec.json.format(msgspec.json.encode(results), indent=2))
     
     # Print summary
     print("\n" + "="*60)
     print("📊 ENHANCED CLINICAL EFFICACY EXTRACTION SUMMARY")
     print("="*60)
     print("Total papers processed: " + str(len(results)))
-    print("Papers with efficacy data: " + str(with_efficacy) + "/" + str(len(results)) + " (" + str(round(with_efficacy/len(results)*100, 1)) + "%)")
+    print("Papers with efficacy data: " + efficacy_share(with_efficacy, len(results)))
     print("API requests used: " + str(requests_today))
     print("Output saved to: " + output_file)
     print("Checkpoint saved to: " + checkpoint_file)
     
     # Calculate statistics for key metrics
     if len(results) > 0:
-        pfs_data = [r['progression_free_survival_median'] for r in results if r['progression_free_survival_median'] is not None]
-        os_data = [r['overall_survival_median'] for r in results if r['overall_survival_median'] is not None]
-        therapy_cycles = [r['therapy_cycles_median'] for r in results if r['therapy_cycles_median'] is not None]
-        ae_data = [r['serious_ae_rate'] for r in results if r['serious_ae_rate'] is not None]
+        pfs_data = [r.progression_free_survival_median for r in results if r.progression_free_survival_median is not None]
+        os_data = [r.overall_survival_median for r in results if r.overall_survival_median is not None]
+        therapy_cycles = [r.therapy_cycles_median for r in results if r.therapy_cycles_median is not None]
+        ae_data = [r.serious_ae_rate for r in results if r.serious_ae_rate is not None]
         
         print(f"\n📈 DATA AVAILABILITY:")
         print(f"PFS data: {len(pfs_data)} papers")
@@ -330,5 +377,13 @@ def main():
         print(f"Therapy cycles: {len(therapy_cycles)} papers")
         print(f"Serious AE data: {len(ae_data)} papers")
 
+def main_all(drugs: List[str]):
+    """Run the per-drug extractions in parallel worker processes"""
+    run_all(main, drugs)
+
 if __name__ == "__main__":
-    main()
+    drugs = sys.argv[1:] or ['azacitidine']
+    if len(drugs) == 1:
+        main(drugs[0])
+    else:
+        main_all(drugs)
@@ -5,13 +5,20 @@ Working Clinical Efficacy Data Extraction for CMML Studies
 
 import json
 import os
-import time
-from dataclasses import dataclass, asdict
-from typing import Optional, Dict, Any, List
+import sys
+from typing import Optional, List
 import google.generativeai as genai
+import msgspec
+from google.api_core.exceptions import ResourceExhausted
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from rate_limiter import RateLimiter
+from efficacy_extraction import (CMML_PATTERN, EXTRACTION_FAILED, Paper, abstract_key, bound_quotes, efficacy_share,
+                                 extractions_by_key, load_papers, resume_checkpoint, reuse_extraction, run_all)
 
-@dataclass
-class ClinicalEfficacyData:
+# Gemini requests/minute allowed for the API key; parallel workers split it between them
+GEMINI_RATE = 5
+
+class ClinicalEfficacyData(msgspec.Struct):
     pmid: str
     citation: str
     url: str
@@ -39,31 +46,16 @@ class ClinicalEfficacyData:
     has_efficacy_data: bool = False
 
     def __post_init__(self):
-        if self.supporting_quotes is None:
-            self.supporting_quotes = []
-
-class ClinicalEfficacyExtractor:
-    def __init__(self, api_key: str):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.supporting_quotes = bound_quotes(self.supporting_quotes)
 
-    def extract_clinical_efficacy(self, study: Dict[str, Any]) -> ClinicalEfficacyData:
-        """Extract clinical efficacy data from a PubMed study."""
-        
-        pmid = study.get('pmid', '')
-        title = study.get('title', '')
-        abstract = study.get('abstract', '')
-        citation = study.get('citation', '')
-        url = study.get('url', "https://pubmed.ncbi.nlm.nih.gov/" + str(pmid) + "/")
-        
-        # Create combined text for analysis
-        text_to_analyze = "Title: " + str(title) + "\n\nAbstract: " + str(abstract)
-        
-        prompt = """
+# Static prompt text is built once at import; only the study text varies per call
+PROMPT_PREFIX = """
 You are a medical data extraction expert. Analyze this research paper and extract clinical efficacy data related to CMML (Chronic Myelomonocytic Leukemia) treatment.
 
 PAPER TO ANALYZE:
-""" + text_to_analyze + """
+"""
+
+PROMPT_SUFFIX = """
 
 EXTRACTION TASK:
 Extract the following clinical efficacy metrics if mentioned in the paper:
@@ -116,8 +108,48 @@ RESPONSE FORMAT (JSON):
 Provide only the JSON response, no additional text.
 """
 
+class ClinicalEfficacyExtractor:
+    def __init__(self, api_key: str, rate: float = GEMINI_RATE):
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.rate_limiter = RateLimiter(rate, 60)  # requests/minute
+
+    @retry(retry=retry_if_exception_type(ResourceExhausted),
+           wait=wait_random_exponential(multiplier=1, max=60),
+           stop=stop_after_attempt(6),
+           reraise=True)
+    def _generate_content(self, prompt: str):
+        """Call Gemini, backing off on transient 429 (ResourceExhausted) responses."""
+        self.rate_limiter.acquire()
+        return self.model.generate_content(prompt)
+
+    def extract_clinical_efficacy(self, study: Paper, drug: str = 'azacitidine') -> ClinicalEfficacyData:
+        """Extract clinical efficacy data from a PubMed study."""
+        
+        pmid = study.pmid
+        title = study.title
+        abstract = study.abstract
+        citation = study.citation
+        url = study.pubmed_url()
+        
+        # Create combined text for analysis
+        text_to_analyze = "Title: " + title + "\n\nAbstract: " + abstract
+        
+        if not CMML_PATTERN.search(text_to_analyze):
+            print("    No CMML terms in title/abstract, skipping Gemini call")
+            return ClinicalEfficacyData(
+                pmid=pmid,
+                citation=citation,
+                url=url,
+                drug=study.drug or drug,
+                efficacy_summary="No CMML terms in title/abstract",
+                has_efficacy_data=False
+            )
+        
+        prompt = "".join((PROMPT_PREFIX, text_to_analyze, PROMPT_SUFFIX))
+
         try:
-            response = self.model.generate_content(prompt)
+            response = self._generate_content(prompt)
             response_text = response.text.strip()
             
             # Clean up response text
@@ -135,7 +167,7 @@ Provide only the JSON response, no additional text.
                 pmid=pmid,
                 citation=citation,
                 url=url,
-                drug=study.get('drug', 'azacitidine'),
+                drug=study.drug or drug,
                 complete_response=extracted_data.get('complete_response'),
                 partial_response=extracted_data.get('partial_response'),
                 marrow_complete_response=extracted_data.get('marrow_complete_response'),
@@ -156,71 +188,85 @@ Provide only the JSON response, no additional text.
         except json.JSONDecodeError as e:
             print("JSON parsing error for PMID " + str(pmid) + ": " + str(e))
             print("Raw response: " + str(response_text[:200]) + "...")
-            return self._create_error_result(study, "JSON parsing error: " + str(e))
+            return self._create_error_result(study, "JSON parsing error: " + str(e), drug)
+            
+        except ResourceExhausted:
+            # Retries exhausted: let main() stop the run and keep the checkpoint
+            raise
             
         except Exception as e:
             error_msg = "Error extracting efficacy data for PMID " + str(pmid) + ": " + str(e)
             print(error_msg)
-            return self._create_error_result(study, str(e))
+            return self._create_error_result(study, str(e), drug)
 
-    def _create_error_result(self, study: Dict[str, Any], error_msg: str) -> ClinicalEfficacyData:
+    def _create_error_result(self, study: Paper, error_msg: str, drug: str = 'azacitidine') -> ClinicalEfficacyData:
         """Create an error result when extraction fails."""
         return ClinicalEfficacyData(
-            pmid=study.get('pmid', ''),
-            citation=study.get('citation', ''),
-            url=study.get('url', "https://pubmed.ncbi.nlm.nih.gov/" + str(study.get('pmid', '')) + "/"),
-            drug=study.get('drug', 'azacitidine'),
-            data_source_location="Extraction failed",
+            pmid=study.pmid,
+            citation=study.citation,
+            url=study.pubmed_url(),
+            drug=study.drug or drug,
+            data_source_location=EXTRACTION_FAILED,
             efficacy_summary=error_msg,
             has_efficacy_data=False
         )
 
-def main():
+def main(drug: str = 'azacitidine', workers: int = 1):
     # Get API key
     api_key = os.getenv('GEMINI_API_KEY')
     if not api_key:
         print("Error: GEMINI_API_KEY environment variable not set")
         return
 
-    # Load azacitidine papers
-    with open('pubmed_all_cmml_papers.json', 'r') as f:
-        pubmed_data = json.load(f)
-    
-    azacitidine_papers = pubmed_data.get('azacitidine', [])
-    print("Starting clinical efficacy extraction for " + str(len(azacitidine_papers)) + " azacitidine papers...")
-    print("Rate limiting: 5 requests/minute (12s intervals), 50 requests/day max")
-    print("Estimated time: " + str(round(min(50, len(azacitidine_papers)) * 12 / 60, 1)) + " minutes for first batch")
+    # Load papers for this drug
+    drug_papers = load_papers(drug)
+    print("Starting clinical efficacy extraction for " + str(len(drug_papers)) + " " + drug + " papers...")
+    # This process's share of the API key's budget when several drugs run in parallel
+    rate = GEMINI_RATE / workers
+    print("Rate limiting: " + str(round(rate, 2)) + " requests/minute (token bucket), 50 requests/day max")
+    print("Estimated time: " + str(round(min(50, len(drug_papers)) / rate, 1)) + " minutes for first batch")
     print("Daily limit allows processing ~50 papers per day")
 
-    # Check for existing checkpoint
-    checkpoint_file = 'clinical_efficacy_azacitidine_checkpoint.json'
-    results = []
-    start_index = 0
-    
-    if os.path.exists(checkpoint_file):
-        try:
-            with open(checkpoint_file, 'r') as f:
-                results = json.load(f)
-            start_index = len(results)
-            print("Resuming from checkpoint: " + str(start_index) + " papers already processed")
-        except:
-            print("Checkpoint file corrupted, starting fresh")
+    # Check for existing checkpoint (records are appended one per line as they are extracted)
+    checkpoint_file = 'clinical_efficacy_' + drug + '_checkpoint.jsonl'
+    legacy_checkpoint_file = 'clinical_efficacy_' + drug + '_checkpoint.json'
+    results = resume_checkpoint(checkpoint_file, legacy_checkpoint_file, ClinicalEfficacyData)
+    start_index = len(results)
+    if start_index:
+        print("Resuming from checkpoint: " + str(start_index) + " papers already processed")
+    checkpoint = open(checkpoint_file, 'ab')
+
+    # Papers sharing title+abstract are sent to Gemini once; the result is fanned out per PMID
+    unique_abstracts = len({abstract_key(p) for p in drug_papers})
+    if unique_abstracts < len(drug_papers):
+        print(str(len(drug_papers) - unique_abstracts) + " duplicate abstracts will reuse earlier extractions")
+    extracted_by_key = extractions_by_key(drug_papers, results)
 
     # Initialize extractor
-    extractor = ClinicalEfficacyExtractor(api_key)
+    extractor = ClinicalEfficacyExtractor(api_key, rate)
     
     # Process papers until API quota is reached
     requests_today = 0
     
-    for i, paper in enumerate(azacitidine_papers[start_index:], start_index + 1):
+    for i, paper in enumerate(drug_papers[start_index:], start_index + 1):
         # No artificial limit - let it run until API quota is reached
             
-        print("Processing paper " + str(i) + "/" + str(len(azacitidine_papers)) + ": PMID " + str(paper.get('pmid')) + " (Request #" + str(requests_today + 1) + " today)")
+        print("Processing paper " + str(i) + "/" + str(len(drug_papers)) + ": PMID " + paper.pmid + " (Request #" + str(requests_today + 1) + " today)")
         
+        key = abstract_key(paper)
+        reused = key in extracted_by_key
         try:
-            result = extractor.extract_clinical_efficacy(paper)
-            results.append(asdict(result))
-            requests_today += 1
+            if reused:
+                result = reuse_extraction(extracted_by_key[key], paper)
+                print("    Duplicate abstract, reusing extraction from PMID " + str(extracted_by_key[key].pmid))
+            else:
+                result = extractor.extract_clinical_efficacy(paper, drug)
+                if result.data_source_location != EXTRACTION_FAILED:
+                    extracted_by_key[key] = result
+                requests_today += 1
+            results.append(result)
+            checkpoint.write(msgspec.json.encode(result) + b'\n')
+            checkpoint.flush()
             
             if result.has_efficacy_data:
                 print("    ✓ Efficacy data found")
@@ -232,10 +278,10 @@ def main():
             print("    ✗ Error: " + error_str)
             
             # Check if this is an API quota error
-            if "quota" in error_str.lower() or "limit" in error_str.lower() or "429" in error_str:
+            if isinstance(e, ResourceExhausted) or "quota" in error_str.lower() or "limit" in error_str.lower() or "429" in error_str:
                 print("\n" + "="*60)
                 print("*** API QUOTA LIMIT REACHED ***")
-                print("Stopped at paper " + str(i) + "/" + str(len(azacitidine_papers)))
+                print("Stopped at paper " + str(i) + "/" + str(len(drug_papers)))
                 print("Total requests made: " + str(requests_today))
                 print("Papers processed successfully: " + str(len(results)))
                 print("="*60)
@@ -244,33 +290,31 @@ def main():
                 # Continue with next paper for other errors
                 continue
         
-        # Save checkpoint every 10 papers
         if i % 10 == 0:
-            with open(checkpoint_file, 'w') as f:
-                json.dump(results, f, indent=2)
-            print("*** CHECKPOINT: " + str(i) + "/" + str(len(azacitidine_papers)) + " papers processed ***")
-            
-        # Respect rate limits: 5 requests per minute = 12 second intervals
-        if i < len(azacitidine_papers):  # Don't wait after last paper
-            print("    Waiting 12 seconds for rate limiting...")
-            time.sleep(12)
+            print("*** CHECKPOINT: " + str(i) + "/" + str(len(drug_papers)) + " papers processed ***")
+    checkpoint.close()
 
     # Save results
-    output_file = 'clinical_efficacy_azacitidine.json'
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    output_file = 'clinical_efficacy_' + drug + '.json'
+    with open(output_file, 'wb') as f:
+        f.write(msgspec.json.format(msgspec.json.encode(results), indent=2))
 
     # Summary
-    with_efficacy = len([r for r in results if r.get('has_efficacy_data')])
+    with_efficacy = len([r for r in results if r.has_efficacy_data])
     print("\n" + "="*60)
     print("CLINICAL EFFICACY EXTRACTION COMPLETED")
     print("="*60)
     print("Total papers processed: " + str(len(results)))
-    if len(results) > 0:
-        print("Papers with efficacy data: " + str(with_efficacy) + "/" + str(len(results)) + " (" + str(round(with_efficacy/len(results)*100, 1)) + "%)")
-    else:
-        print("Papers with efficacy data: 0/0 (0%)")
+    print("Papers with efficacy data: " + efficacy_share(with_efficacy, len(results)))
     print("Results saved to " + str(output_file))
 
+def main_all(drugs: List[str]):
+    """Run the per-drug extractions in parallel worker processes."""
+    run_all(main, drugs)
+
 if __name__ == "__main__":
-    main()
+    drugs = sys.argv[1:] or ['azacitidine']
+    if len(drugs) == 1:
+        main(drugs[0])
+    else:
+        main_all(drugs)
@@ -3,11 +3,14 @@
 Extract adverse events from decitabine CMML papers with abstracts
 """
 
+import asyncio
 import os
-import json
-import time
-import google.generativeai as genai
-from datetime import datetime
+import re
+import msgspec
+import aiohttp
+from gemini_extraction import (BATCH_SIZE, AdverseEvents, GeminiExtractor, JsonArrayWriter, content_key,
+                               load_json, with_paper_fields)
+from typing import Optional, Union
 
 # Configure Gemini API
 api_key = os.getenv('GEMINI_API_KEY')
@@ -15,38 +18,10 @@ if not api_key:
     print("Error: GEMINI_API_KEY environment variable not set")
     exit(1)
 
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-1.5-flash')
-
-def extract_decitabine_adverse_events():
-    # Load the decitabine papers with abstracts
-    with open('Decitabine_extracted_with_abstracts.json', 'r') as f:
-        papers = json.load(f)
-    
-    # Filter papers that have abstracts
-    papers_with_abstracts = [p for p in papers if p.get('abstract')]
-    
-    print(f"Extracting adverse events from {len(papers_with_abstracts)} decitabine papers with abstracts...")
-    
-    extracted_papers = []
-    
-    for i, paper in enumerate(papers_with_abstracts):
-        pmid = paper['pmid']
-        title = paper.get('title', '')
-        abstract = paper.get('abstract', '')
-        citation = paper.get('citation', '')
-        
-        print(f"\n{i+1}. Processing PMID {pmid}: {title[:60] if title else 'No title'}...")
-        
-        # Create the prompt for extraction
-        prompt = f"""
-You are a medical data extraction specialist. Extract adverse event data from this CMML paper that focuses on DECITABINE treatment.
-
-Paper Information:
-- PMID: {pmid}
-- Title: {title}
-- Abstract: {abstract}
-- Citation: {citation}
+# Static instructions and schema first so every request shares a byte-identical
+# prefix; only the paper-specific suffix varies
+STATIC_PREFIX = """
+You are a medical data extraction specialist. Extract adverse event data from the CMML paper below that focuses on DECITABINE treatment.
 
 Extract ONLY adverse events specifically mentioned for DECITABINE treatment in CMML patients:
 
@@ -66,93 +41,120 @@ IMPORTANT:
 - For adverse events, provide specific percentages or counts when available
 
 Return the data in this exact JSON format:
-{{
-    "pmid": "{pmid}",
-    "citation": "{citation}",
-    "title": "{title}",
-    "abstract": "{abstract}",
+{
+    "pmid": "<pmid from Paper Information>",
+    "citation": "<citation from Paper Information>",
+    "title": "<title from Paper Information>",
+    "abstract": "<abstract from Paper Information>",
     "has_adverse_event_data": true/false,
-    "adverse_events": {{
+    "adverse_events": {
         "any_adverse_events": "text description or null",
         "grade_3_4_events": "text description or null",
         "serious_adverse_events": "percentage or count or null",
         "most_common_events": ["list of events or null"],
         "treatment_discontinuation": "percentage or count or null",
         "treatment_related_deaths": "count or null"
-    }},
+    },
     "extraction_notes": "brief notes about what was found"
-}}
+}
 """
 
-        try:
-            response = model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Try to parse the JSON response
-            try:
-                # Clean up the response to extract JSON
-                if '```json' in response_text:
-                    json_start = response_text.find('```json') + 7
-                    json_end = response_text.find('```', json_start)
-                    json_str = response_text[json_start:json_end].strip()
-                elif '```' in response_text:
-                    json_start = response_text.find('```') + 3
-                    json_end = response_text.find('```', json_start)
-                    json_str = response_text[json_start:json_end].strip()
-                else:
-                    json_str = response_text
-                
-                extracted_data = json.loads(json_str)
-                
-                # Add the extracted data to our list
-                extracted_papers.append(extracted_data)
-                
-                # Print summary
-                has_data = extracted_data.get('has_adverse_event_data', False)
-                if has_data:
-                    ae = extracted_data.get('adverse_events', {}).get('any_adverse_events', '')
-                    print(f"   ✓ Adverse events found: {ae[:100]}...")
-                else:
-                    print(f"   ✗ No adverse events found")
-                
-            except json.JSONDecodeError as e:
-                print(f"   ✗ JSON parsing error: {e}")
-                # Add a basic entry
-                extracted_papers.append({
-                    "pmid": pmid,
-                    "citation": citation,
-                    "title": title,
-                    "abstract": abstract,
-                    "has_adverse_event_data": False,
-                    "adverse_events": {},
-                    "extraction_notes": f"JSON parsing error: {e}"
-                })
-                
-        except Exception as e:
-            print(f"   ✗ API error: {e}")
-            # Add a basic entry
-            extracted_papers.append({
-                "pmid": pmid,
-                "citation": citation,
-                "title": title,
-                "abstract": abstract,
+# Abstracts shorter than this, or without any of these terms, cannot carry AE data
+MIN_ABSTRACT_LENGTH = 200
+AE_KEYWORDS = re.compile(r'adverse|toxic|grade|tolerab|discontin', re.IGNORECASE)
+
+def prefilter_reason(abstract: str):
+    """Why a paper can skip the API call, or None if it needs extraction"""
+    if len(abstract) < MIN_ABSTRACT_LENGTH:
+        return f"pre-filtered: abstract shorter than {MIN_ABSTRACT_LENGTH} characters"
+    if not AE_KEYWORDS.search(abstract):
+        return "pre-filtered: no AE keywords"
+    return None
+
+class AEExtraction(msgspec.Struct, kw_only=True):
+    """Shape the model must return; decoding rejects missing or mistyped fields"""
+    pmid: Union[str, int, None] = None
+    citation: Optional[str] = None
+    title: Optional[str] = None
+    abstract: Optional[str] = None
+    has_adverse_event_data: bool
+    adverse_events: AdverseEvents = msgspec.field(default_factory=AdverseEvents)
+    extraction_notes: Optional[str] = None
+
+class AEExtractor(GeminiExtractor):
+    """Decitabine adverse event extraction"""
+
+    def report(self, record: dict):
+        if record.get('has_adverse_event_data', False):
+            ae = record.get('adverse_events', {}).get('any_adverse_events') or ''
+            print(f"   ✓ Adverse events found: {ae[:100]}...")
+        else:
+            print(f"   ✗ No adverse events found")
+
+async def extract_decitabine_adverse_events():
+    # Load the decitabine papers with abstracts
+    papers = load_json('Decitabine_extracted_with_abstracts.json')
+    
+    # Filter papers that have abstracts
+    papers_with_abstracts = [p for p in papers if p.get('abstract')]
+    
+    print(f"Extracting adverse events from {len(papers_with_abstracts)} decitabine papers with abstracts...")
+    
+    # Stream records to disk as they complete
+    output_file = 'Decitabine_adverse_events_extracted.json'
+    writer = JsonArrayWriter(output_file)
+    pending = {}
+    next_index = 0
+    papers_with_ae = 0
+    
+    def emit_ready():
+        # Emit in input order as soon as the next record is ready
+        nonlocal next_index, papers_with_ae
+        while next_index in pending:
+            record = pending.pop(next_index)
+            writer.write(record)
+            if record.get('has_adverse_event_data', False):
+                papers_with_ae += 1
+            next_index += 1
+    
+    # Papers sharing title+abstract get one API call, fanned back out to each of them;
+    # papers that cannot contain AE data get a null record without a call
+    groups = {}
+    for i, paper in enumerate(papers_with_abstracts):
+        reason = prefilter_reason(paper.get('abstract', ''))
+        if reason:
+            pending[i] = with_paper_fields({
                 "has_adverse_event_data": False,
                 "adverse_events": {},
-                "extraction_notes": f"API error: {e}"
-            })
-        
-        time.sleep(2)  # Rate limiting
+                "extraction_notes": reason
+            }, paper)
+        else:
+            groups.setdefault(content_key(paper), []).append(i)
+    print(f"Skipped {len(pending)} papers by pre-filter; "
+          f"{len(groups)} unique title+abstract combinations to extract")
+    emit_ready()
     
-    # Save the extracted data
-    output_file = 'Decitabine_adverse_events_extracted.json'
-    with open(output_file, 'w') as f:
-        json.dump(extracted_papers, f, indent=2)
+    # Send the groups BATCH_SIZE to a prompt, all batches scheduled at once;
+    # the semaphore and rate limiter pace the requests
+    group_list = list(groups.values())
+    batches = [group_list[k:k + BATCH_SIZE] for k in range(0, len(group_list), BATCH_SIZE)]
+    print(f"Sending them in {len(batches)} batches of up to {BATCH_SIZE}")
+    extractor = AEExtractor(api_key, STATIC_PREFIX, AEExtraction, 'has_adverse_event_data',
+                            rate=30, period=60)  # 30 requests/minute
+    async with aiohttp.ClientSession() as session:
+        tasks = [extractor.extract_batch(session, papers_with_abstracts, batch) for batch in batches]
+        for next_done in asyncio.as_completed(tasks):
+            for indices, record in await next_done:
+                for i in indices:
+                    pending[i] = with_paper_fields(record, papers_with_abstracts[i])
+            emit_ready()
+    emit_ready()
+    writer.close()
     
     print(f"\n💾 Saved extracted adverse events to {output_file}")
     
     # Summary statistics
-    total_papers = len(extracted_papers)
-    papers_with_ae = sum(1 for p in extracted_papers if p.get('has_adverse_event_data', False))
+    total_papers = writer.count
     
     print(f"\n📊 Extraction Summary:")
     print(f"Total papers processed: {total_papers}")
@@ -160,4 +162,4 @@ Return the data in this exact JSON format:
     print(f"Success rate: {papers_with_ae/total_papers*100:.1f}%")
 
 if __name__ == "__main__":
-    extract_decitabine_adverse_events()
+    asyncio.run(extract_decitabine_adverse_events())
@@ -4,56 +4,31 @@ Simple Decitabine Clinical Efficacy Data Extraction for CMML Studies
 Creates basic structure without LLM processing
 """
 
-import json
+import orjson
 import os
-from dataclasses import dataclass, asdict
-from typing import Optional, Dict, Any, List
+import re
+from typing import Dict, Any
+from clinical_efficacy_data import ClinicalEfficacyData
 
-@dataclass
-class ClinicalEfficacyData:
-    pmid: str
-    citation: str
-    url: str
-    drug: str
-    
-    # Efficacy metrics
-    complete_response: Optional[float] = None
-    partial_response: Optional[float] = None
-    marrow_complete_response: Optional[float] = None
-    overall_response_rate: Optional[float] = None
-    
-    # Survival metrics
-    progression_free_survival_median: Optional[float] = None
-    overall_survival_median: Optional[float] = None
-    
-    # Study details
-    total_patients: Optional[int] = None
-    cmml_patients: Optional[int] = None
-    
-    # Metadata
-    supporting_quotes: List[str] = None
-    data_source_location: str = ""
-    extraction_confidence: Optional[float] = None
-    efficacy_summary: str = ""
-    has_efficacy_data: bool = False
+# Single pass per field instead of one `in` scan per keyword
+KEYWORD_PATTERN = re.compile(
+    r'(?P<cmml>cmml|chronic myelomonocytic leukemia)|(?P<decitabine>decitabine)',
+    re.IGNORECASE)
 
-    def __post_init__(self):
-        if self.supporting_quotes is None:
-            self.supporting_quotes = []
+def keyword_hits(*fields: str) -> set:
+    """Return the names of the keyword groups found in any of the fields"""
+    return {m.lastgroup for field in fields for m in KEYWORD_PATTERN.finditer(field)}
 
 def extract_basic_info(study: Dict[str, Any]) -> ClinicalEfficacyData:
     """Extract basic information from study without LLM processing."""
     
-    pmid = study.get('pmid', '')
     title = study.get('title', '')
     abstract = study.get('abstract', '')
-    citation = study.get('citation', '')
-    url = study.get('url', "https://pubmed.ncbi.nlm.nih.gov/" + str(pmid) + "/")
     
     # Check if study mentions CMML and decitabine
-    text_to_check = (title + " " + abstract).lower()
-    has_cmml = "cmml" in text_to_check or "chronic myelomonocytic leukemia" in text_to_check
-    has_decitabine = "decitabine" in text_to_check
+    hits = keyword_hits(title, abstract)
+    has_cmml = 'cmml' in hits
+    has_decitabine = 'decitabine' in hits
     
     # Basic summary
     if has_cmml and has_decitabine:
@@ -66,10 +41,8 @@ def extract_basic_info(study: Dict[str, Any]) -> ClinicalEfficacyData:
         efficacy_summary = "Study does not appear to focus on CMML treatment. LLM processing required for detailed efficacy data extraction."
         has_efficacy_data = False
     
-    return ClinicalEfficacyData(
-        pmid=pmid,
-        citation=citation,
-        url=url,
+    return ClinicalEfficacyData.from_study(
+        study,
         drug='decitabine',
         supporting_quotes=[],
         data_source_location="title_or_abstract",
@@ -80,23 +53,25 @@ def extract_basic_info(study: Dict[str, Any]) -> ClinicalEfficacyData:
 
 def main():
     # Load decitabine papers
-    with open('pubmed_decitabine_cmml_complete.json', 'r') as f:
-        pubmed_data = json.load(f)
+    with open('pubmed_decitabine_cmml_complete.json', 'rb') as f:
+        pubmed_data = orjson.loads(f.read())
     
     decitabine_papers = pubmed_data.get('decitabine', [])
     print("Processing " + str(len(decitabine_papers)) + " decitabine papers...")
 
     # Process all papers
     results = []
+    with_efficacy = 0
     
     for i, paper in enumerate(decitabine_papers, 1):
         print("Processing paper " + str(i) + "/" + str(len(decitabine_papers)) + ": PMID " + str(paper.get('pmid')))
         
         try:
             result = extract_basic_info(paper)
-            results.append(asdict(result))
+            results.append(result.to_dict())
             
             if result.has_efficacy_data:
+                with_efficacy += 1
                 print("    ✓ CMML + Decitabine mentioned")
             else:
                 print("    ○ Basic info extracted")
@@ -107,11 +82,10 @@ def main():
 
     # Save results
     output_file = 'Decitabine_extracted.json'
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
 
     # Summary
-    with_efficacy = len([r for r in results if r.get('has_efficacy_data')])
     print("\n" + "="*60)
     print("DECITABINE BASIC EXTRACTION COMPLETED")
     print("="*60)
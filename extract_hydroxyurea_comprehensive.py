@@ -3,11 +3,13 @@
 Extract efficacy data from comprehensive hydroxyurea CMML papers
 """
 
+import asyncio
 import os
-import json
-import time
-import google.generativeai as genai
-from datetime import datetime
+import msgspec
+import aiohttp
+from gemini_extraction import (BATCH_SIZE, AdverseEvents, GeminiExtractor, JsonArrayWriter, content_key,
+                               load_json, with_paper_fields)
+from typing import Optional, Union
 
 # Configure Gemini API
 api_key = os.getenv('GEMINI_API_KEY')
@@ -15,35 +17,10 @@ if not api_key:
     print("Error: GEMINI_API_KEY environment variable not set")
     exit(1)
 
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-1.5-flash')
-
-def extract_efficacy_data():
-    # Load the detailed papers
-    with open('pubmed_hydroxyurea_cmml_detailed.json', 'r') as f:
-        papers = json.load(f)
-    
-    print(f"Extracting efficacy and adverse event data from {len(papers)} hydroxyurea CMML papers...")
-    
-    extracted_papers = []
-    
-    for i, paper in enumerate(papers):
-        pmid = paper['pmid']
-        title = paper['title']
-        abstract = paper.get('abstract', '')
-        citation = paper.get('citation', '')
-        
-        print(f"\n{i+1}. Processing PMID {pmid}: {title[:60]}...")
-        
-        # Create the prompt for extraction
-        prompt = f"""
-You are a medical data extraction specialist. Extract clinical efficacy and adverse event data from this CMML paper that specifically focuses on HYDROXYUREA treatment.
-
-Paper Information:
-- PMID: {pmid}
-- Title: {title}
-- Abstract: {abstract}
-- Citation: {citation}
+# Static instructions and schema first so every request shares a byte-identical
+# prefix; only the paper-specific suffix varies
+STATIC_PREFIX = """
+You are a medical data extraction specialist. Extract clinical efficacy and adverse event data from the CMML paper below that specifically focuses on HYDROXYUREA treatment.
 
 Extract ONLY the following data points if they are specifically mentioned for HYDROXYUREA treatment in CMML patients:
 
@@ -71,11 +48,11 @@ IMPORTANT:
 - For adverse events, provide specific percentages or counts when available
 
 Return the data in this exact JSON format:
-{{
-    "pmid": "{pmid}",
-    "citation": "{citation}",
-    "title": "{title}",
-    "abstract": "{abstract}",
+{
+    "pmid": "<pmid from Paper Information>",
+    "citation": "<citation from Paper Information>",
+    "title": "<title from Paper Information>",
+    "abstract": "<abstract from Paper Information>",
     "has_efficacy_data": true/false,
     "complete_response": number or null,
     "overall_response_rate": number or null,
@@ -83,95 +60,100 @@ Return the data in this exact JSON format:
     "overall_survival_median": number or null,
     "number_of_patients": number or null,
     "treatment_cycles": number or null,
-    "adverse_events": {{
+    "adverse_events": {
         "any_adverse_events": "text description or null",
         "grade_3_4_events": "text description or null",
         "serious_adverse_events": "percentage or count or null",
         "most_common_events": ["list of events or null"],
         "treatment_discontinuation": "percentage or count or null",
         "treatment_related_deaths": "count or null"
-    }},
+    },
     "extraction_notes": "brief notes about what was found"
-}}
+}
 """
 
-        try:
-            response = model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Try to parse the JSON response
-            try:
-                # Clean up the response to extract JSON
-                if '```json' in response_text:
-                    json_start = response_text.find('```json') + 7
-                    json_end = response_text.find('```', json_start)
-                    json_str = response_text[json_start:json_end].strip()
-                elif '```' in response_text:
-                    json_start = response_text.find('```') + 3
-                    json_end = response_text.find('```', json_start)
-                    json_str = response_text[json_start:json_end].strip()
-                else:
-                    json_str = response_text
-                
-                extracted_data = json.loads(json_str)
-                
-                # Add the extracted data to our list
-                extracted_papers.append(extracted_data)
-                
-                # Print summary
-                has_data = extracted_data.get('has_efficacy_data', False)
-                if has_data:
-                    cr = extracted_data.get('complete_response')
-                    orr = extracted_data.get('overall_response_rate')
-                    pfs = extracted_data.get('progression_free_survival_median')
-                    os_val = extracted_data.get('overall_survival_median')
-                    ae = extracted_data.get('adverse_events', {})
-                    print(f"   ✓ Efficacy data found: CR={cr}%, ORR={orr}%, PFS={pfs}m, OS={os_val}m")
-                    if ae.get('any_adverse_events'):
-                        print(f"   ✓ Adverse events: {ae.get('any_adverse_events')[:100]}...")
-                else:
-                    print(f"   ✗ No efficacy data found")
-                
-            except json.JSONDecodeError as e:
-                print(f"   ✗ JSON parsing error: {e}")
-                print(f"   Response: {response_text[:200]}...")
-                # Add a basic entry
-                extracted_papers.append({
-                    "pmid": pmid,
-                    "citation": citation,
-                    "title": title,
-                    "abstract": abstract,
-                    "has_efficacy_data": False,
-                    "adverse_events": {},
-                    "extraction_notes": f"JSON parsing error: {e}"
-                })
-                
-        except Exception as e:
-            print(f"   ✗ API error: {e}")
-            # Add a basic entry
-            extracted_papers.append({
-                "pmid": pmid,
-                "citation": citation,
-                "title": title,
-                "abstract": abstract,
-                "has_efficacy_data": False,
-                "adverse_events": {},
-                "extraction_notes": f"API error: {e}"
-            })
-        
-        time.sleep(2)  # Rate limiting
+class EfficacyExtraction(msgspec.Struct, kw_only=True):
+    """Shape the model must return; decoding rejects missing or mistyped fields"""
+    pmid: Union[str, int, None] = None
+    citation: Optional[str] = None
+    title: Optional[str] = None
+    abstract: Optional[str] = None
+    has_efficacy_data: bool
+    # Numbers keep their JSON type (25 stays an int) and answers like "45%" are kept as
+    # returned instead of failing validation, as in the adverse event fields
+    complete_response: Union[str, int, float, None] = None
+    overall_response_rate: Union[str, int, float, None] = None
+    progression_free_survival_median: Union[str, int, float, None] = None
+    overall_survival_median: Union[str, int, float, None] = None
+    number_of_patients: Union[str, int, float, None] = None
+    treatment_cycles: Union[str, int, float, None] = None
+    adverse_events: AdverseEvents = msgspec.field(default_factory=AdverseEvents)
+    extraction_notes: Optional[str] = None
+
+class EfficacyExtractor(GeminiExtractor):
+    """Hydroxyurea efficacy and adverse event extraction"""
+
+    def report(self, record: dict):
+        if record.get('has_efficacy_data', False):
+            cr = record.get('complete_response')
+            orr = record.get('overall_response_rate')
+            pfs = record.get('progression_free_survival_median')
+            os_val = record.get('overall_survival_median')
+            ae = record.get('adverse_events', {})
+            print(f"   ✓ Efficacy data found: CR={cr}%, ORR={orr}%, PFS={pfs}m, OS={os_val}m")
+            if ae.get('any_adverse_events'):
+                print(f"   ✓ Adverse events: {ae.get('any_adverse_events')[:100]}...")
+        else:
+            print(f"   ✗ No efficacy data found")
+
+async def extract_efficacy_data():
+    # Load the detailed papers
+    papers = load_json('pubmed_hydroxyurea_cmml_detailed.json.gz')
+    
+    print(f"Extracting efficacy and adverse event data from {len(papers)} hydroxyurea CMML papers...")
     
-    # Save the extracted data
+    # Stream records to disk as they complete
     output_file = 'Hydroxyurea_extracted_comprehensive.json'
-    with open(output_file, 'w') as f:
-        json.dump(extracted_papers, f, indent=2)
+    writer = JsonArrayWriter(output_file)
+    pending = {}
+    next_index = 0
+    papers_with_data = 0
+    papers_with_ae = 0
+    
+    # Papers sharing title+abstract get one API call, fanned back out to each of them
+    groups = {}
+    for i, paper in enumerate(papers):
+        groups.setdefault(content_key(paper), []).append(i)
+    print(f"{len(groups)} unique title+abstract combinations to extract")
+    
+    # Send the groups BATCH_SIZE to a prompt, all batches scheduled at once;
+    # the semaphore and rate limiter pace the requests
+    group_list = list(groups.values())
+    batches = [group_list[k:k + BATCH_SIZE] for k in range(0, len(group_list), BATCH_SIZE)]
+    print(f"Sending them in {len(batches)} batches of up to {BATCH_SIZE}")
+    extractor = EfficacyExtractor(api_key, STATIC_PREFIX, EfficacyExtraction, 'has_efficacy_data',
+                                  rate=30, period=60)  # 30 requests/minute
+    async with aiohttp.ClientSession() as session:
+        tasks = [extractor.extract_batch(session, papers, batch) for batch in batches]
+        for next_done in asyncio.as_completed(tasks):
+            for indices, record in await next_done:
+                for i in indices:
+                    pending[i] = with_paper_fields(record, papers[i])
+            # Emit in input order as soon as the next record is ready
+            while next_index in pending:
+                record = pending.pop(next_index)
+                writer.write(record)
+                if record.get('has_efficacy_data', False):
+                    papers_with_data += 1
+                if record.get('adverse_events', {}).get('any_adverse_events'):
+                    papers_with_ae += 1
+                next_index += 1
+    writer.close()
     
     print(f"\n💾 Saved extracted data to {output_file}")
     
     # Summary statistics
-    total_papers = len(extracted_papers)
-    papers_with_data = sum(1 for p in extracted_papers if p.get('has_efficacy_data', False))
-    papers_with_ae = sum(1 for p in extracted_papers if p.get('adverse_events', {}).get('any_adverse_events'))
+    total_papers = writer.count
     
     print(f"\n📊 Extraction Summary:")
     print(f"Total papers processed: {total_papers}")
@@ -180,4 +162,4 @@ Return the data in this exact JSON format:
     print(f"Success rate: {papers_with_data/total_papers*100:.1f}%")
 
 if __name__ == "__main__":
-    extract_efficacy_data()
+    asyncio.run(extract_efficacy_data())
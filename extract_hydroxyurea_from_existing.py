@@ -4,49 +4,34 @@ Extract Hydroxyurea Clinical Efficacy Data from Existing Data
 Uses the existing cmml_detailed_outcomes.json file which has rich data
 """
 
-import json
+import ijson
+import orjson
 import os
-from dataclasses import dataclass, asdict
-from typing import Optional, Dict, Any, List
+import re
+from typing import Dict, Any
+from clinical_efficacy_data import ClinicalEfficacyData
 
-@dataclass
-class ClinicalEfficacyData:
-    pmid: str
-    citation: str
-    url: str
-    drug: str
-    
-    # Efficacy metrics
-    complete_response: Optional[float] = None
-    partial_response: Optional[float] = None
-    marrow_complete_response: Optional[float] = None
-    overall_response_rate: Optional[float] = None
-    
-    # Survival metrics
-    progression_free_survival_median: Optional[float] = None
-    overall_survival_median: Optional[float] = None
-    
-    # Study details
-    total_patients: Optional[int] = None
-    cmml_patients: Optional[int] = None
-    
-    # Metadata
-    supporting_quotes: List[str] = None
-    data_source_location: str = ""
-    extraction_confidence: Optional[float] = None
-    efficacy_summary: str = ""
-    has_efficacy_data: bool = False
+# Single pass per field instead of one `in` scan per keyword; "hu" is kept
+# as a bare substring to match the original screening
+KEYWORD_PATTERN = re.compile(
+    r'(?P<cmml>cmml|chronic myelomonocytic leukemia)|(?P<hydroxyurea>hydroxyurea|hu)'
+    r'|(?P<efficacy>response|survival|efficacy|outcome|improvement)',
+    re.IGNORECASE)
+
+# Patient-count patterns fused into one alternation, in the old priority order
+PATIENT_PATTERN = re.compile(
+    r'(?P<generic>\d+)\s*patients|(?P<cmml>\d+)\s*CMML\s*patients'
+    r'|n\s*=\s*(?P<neq>\d+)|(?P<subj>\d+)\s*subjects',
+    re.IGNORECASE)
 
-    def __post_init__(self):
-        if self.supporting_quotes is None:
-            self.supporting_quotes = []
+def keyword_hits(*fields: str) -> set:
+    """Return the names of the keyword groups found in any of the fields"""
+    return {m.lastgroup for field in fields for m in KEYWORD_PATTERN.finditer(field)}
 
 def extract_from_existing_data(study: Dict[str, Any]) -> ClinicalEfficacyData:
     """Extract clinical efficacy data from existing study data."""
     
-    pmid = study.get('pmid', '')
     citation = study.get('citation', '')
-    url = study.get('url', "https://pubmed.ncbi.nlm.nih.gov/" + str(pmid) + "/")
     key_findings = study.get('key_findings', '')
     patient_population = study.get('patient_population', '')
     treatment_details = study.get('treatment_details', '')
@@ -54,9 +39,9 @@ def extract_from_existing_data(study: Dict[str, Any]) -> ClinicalEfficacyData:
     cmml_sample_size = study.get('cmml_sample_size')
     
     # Check if study mentions CMML and hydroxyurea
-    text_to_check = (citation + " " + key_findings + " " + patient_population + " " + treatment_details).lower()
-    has_cmml = "cmml" in text_to_check or "chronic myelomonocytic leukemia" in text_to_check
-    has_hydroxyurea = "hydroxyurea" in text_to_check or "hu" in text_to_check
+    hits = keyword_hits(citation, key_findings, patient_population, treatment_details)
+    has_cmml = 'cmml' in hits
+    has_hydroxyurea = 'hydroxyurea' in hits
     
     # Check for efficacy data in the existing fields
     has_efficacy_data = False
@@ -64,7 +49,7 @@ def extract_from_existing_data(study: Dict[str, Any]) -> ClinicalEfficacyData:
     
     if has_cmml and has_hydroxyurea:
         # Look for specific efficacy mentions
-        if any(keyword in text_to_check for keyword in ['response', 'survival', 'efficacy', 'outcome', 'improvement']):
+        if 'efficacy' in hits:
             has_efficacy_data = True
             efficacy_summary = f"Study contains CMML and hydroxyurea treatment data. Key findings: {key_findings}"
         else:
@@ -78,29 +63,22 @@ def extract_from_existing_data(study: Dict[str, Any]) -> ClinicalEfficacyData:
     total_patients = None
     cmml_patients = cmml_sample_size
     
-    # Try to extract numbers from text
-    import re
-    
-    # Look for patient numbers in text
-    patient_patterns = [
-        r'(\d+)\s*patients',
-        r'(\d+)\s*CMML\s*patients',
-        r'n\s*=\s*(\d+)',
-        r'(\d+)\s*subjects'
-    ]
-    
-    for pattern in patient_patterns:
-        matches = re.findall(pattern, text_to_check)
-        if matches:
-            if not total_patients:
-                total_patients = int(matches[0])
-            if not cmml_patients and 'cmml' in pattern:
-                cmml_patients = int(matches[0])
-    
-    return ClinicalEfficacyData(
-        pmid=pmid,
-        citation=citation,
-        url=url,
+    # Look for patient numbers in text, keeping the first hit of each kind; fields
+    # are scanned in place rather than joined into one throwaway string
+    first_match = {}
+    for field in (citation, key_findings, patient_population, treatment_details):
+        for m in PATIENT_PATTERN.finditer(field):
+            first_match.setdefault(m.lastgroup, int(m.group(m.lastgroup)))
+    
+    for group in ('generic', 'cmml', 'neq', 'subj'):
+        if group in first_match:
+            total_patients = first_match[group]
+            break
+    if not cmml_patients:
+        cmml_patients = first_match.get('cmml')
+    
+    return ClinicalEfficacyData.from_study(
+        study,
         drug='hydroxyurea',
         total_patients=total_patients,
         cmml_patients=cmml_patients,
@@ -114,39 +92,38 @@ def extract_from_existing_data(study: Dict[str, Any]) -> ClinicalEfficacyData:
 def main():
     """Main function to extract hydroxyurea data from existing data."""
     
-    # Load existing hydroxyurea data
-    with open('data/cmml_detailed_outcomes.json', 'r') as f:
-        data = json.load(f)
-    
-    hydroxyurea_papers = data.get('hydroxyurea', [])
-    print("Processing " + str(len(hydroxyurea_papers)) + " hydroxyurea papers from existing data...")
+    # Stream existing hydroxyurea data; other drugs' entries are never built
+    with open('data/cmml_detailed_outcomes.json', 'rb') as f:
+        papers_iter = ijson.items(f, 'hydroxyurea.item', use_float=True)
+        print("Processing hydroxyurea papers from existing data...")
 
-    # Process all papers
-    results = []
-    
-    for i, paper in enumerate(hydroxyurea_papers, 1):
-        print("Processing paper " + str(i) + "/" + str(len(hydroxyurea_papers)) + ": PMID " + str(paper.get('pmid')))
+        # Process all papers
+        results = []
+        with_efficacy = 0
+        
+        for i, paper in enumerate(papers_iter, 1):
+            print("Processing paper " + str(i) + ": PMID " + str(paper.get('pmid')))
         
-        try:
-            result = extract_from_existing_data(paper)
-            results.append(asdict(result))
+            try:
+                result = extract_from_existing_data(paper)
+                results.append(result.to_dict())
             
-            if result.has_efficacy_data:
-                print("    ✓ CMML + Hydroxyurea with efficacy data")
-            else:
-                print("    ○ Basic info extracted")
+                if result.has_efficacy_data:
+                    with_efficacy += 1
+                    print("    ✓ CMML + Hydroxyurea with efficacy data")
+                else:
+                    print("    ○ Basic info extracted")
                 
-        except Exception as e:
-            print("    ✗ Error: " + str(e))
-            continue
+            except Exception as e:
+                print("    ✗ Error: " + str(e))
+                continue
 
     # Save results
     output_file = 'Hydroxyurea_extracted.json'
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
 
     # Summary
-    with_efficacy = len([r for r in results if r.get('has_efficacy_data')])
     print("\n" + "="*60)
     print("HYDROXYUREA EXTRACTION FROM EXISTING DATA COMPLETED")
     print("="*60)
@@ -4,58 +4,36 @@ Simple Hydroxyurea Clinical Efficacy Data Extraction for CMML Studies
 Creates basic structure without LLM processing
 """
 
-import json
+import ijson
+import orjson
 import os
-from dataclasses import dataclass, asdict
-from typing import Optional, Dict, Any, List
+import re
+from typing import Dict, Any
+from clinical_efficacy_data import ClinicalEfficacyData
 
-@dataclass
-class ClinicalEfficacyData:
-    pmid: str
-    citation: str
-    url: str
-    drug: str
-    
-    # Efficacy metrics
-    complete_response: Optional[float] = None
-    partial_response: Optional[float] = None
-    marrow_complete_response: Optional[float] = None
-    overall_response_rate: Optional[float] = None
-    
-    # Survival metrics
-    progression_free_survival_median: Optional[float] = None
-    overall_survival_median: Optional[float] = None
-    
-    # Study details
-    total_patients: Optional[int] = None
-    cmml_patients: Optional[int] = None
-    
-    # Metadata
-    supporting_quotes: List[str] = None
-    data_source_location: str = ""
-    extraction_confidence: Optional[float] = None
-    efficacy_summary: str = ""
-    has_efficacy_data: bool = False
+# Single pass per field instead of one `in` scan per keyword; "hu" is kept
+# as a bare substring to match the original screening
+KEYWORD_PATTERN = re.compile(
+    r'(?P<cmml>cmml|chronic myelomonocytic leukemia)|(?P<hydroxyurea>hydroxyurea|hu)',
+    re.IGNORECASE)
 
-    def __post_init__(self):
-        if self.supporting_quotes is None:
-            self.supporting_quotes = []
+def keyword_hits(*fields: str) -> set:
+    """Return the names of the keyword groups found in any of the fields"""
+    return {m.lastgroup for field in fields for m in KEYWORD_PATTERN.finditer(field)}
 
 def extract_basic_info(study: Dict[str, Any]) -> ClinicalEfficacyData:
     """Extract basic information from study without LLM processing."""
     
-    pmid = study.get('pmid', '')
     citation = study.get('citation', '')
     key_findings = study.get('key_findings', '')
     patient_population = study.get('patient_population', '')
     treatment_details = study.get('treatment_details', '')
     supporting_quotes = study.get('supporting_quotes', [])
-    url = study.get('url', "https://pubmed.ncbi.nlm.nih.gov/" + str(pmid) + "/")
     
     # Check if study mentions CMML and hydroxyurea
-    text_to_check = (citation + " " + key_findings + " " + patient_population + " " + treatment_details).lower()
-    has_cmml = "cmml" in text_to_check or "chronic myelomonocytic leukemia" in text_to_check
-    has_hydroxyurea = "hydroxyurea" in text_to_check or "hu" in text_to_check
+    hits = keyword_hits(citation, key_findings, patient_population, treatment_details)
+    has_cmml = 'cmml' in hits
+    has_hydroxyurea = 'hydroxyurea' in hits
     
     # Basic summary
     if has_cmml and has_hydroxyurea:
@@ -68,10 +46,8 @@ def extract_basic_info(study: Dict[str, Any]) -> ClinicalEfficacyData:
         efficacy_summary = "Study does not appear to focus on CMML treatment. LLM processing required for detailed efficacy data extraction."
         has_efficacy_data = False
     
-    return ClinicalEfficacyData(
-        pmid=pmid,
-        citation=citation,
-        url=url,
+    return ClinicalEfficacyData.from_study(
+        study,
         drug='hydroxyurea',
         supporting_quotes=[],
         data_source_location="title_or_abstract",
@@ -81,39 +57,38 @@ def extract_basic_info(study: Dict[str, Any]) -> ClinicalEfficacyData:
     )
 
 def main():
-    # Load hydroxyurea papers from the existing data
-    with open('data/cmml_detailed_outcomes.json', 'r') as f:
-        data = json.load(f)
-    
-    hydroxyurea_papers = data.get('hydroxyurea', [])
-    print("Processing " + str(len(hydroxyurea_papers)) + " hydroxyurea papers...")
+    # Stream hydroxyurea papers from the existing data; other drugs' entries are never built
+    with open('data/cmml_detailed_outcomes.json', 'rb') as f:
+        papers_iter = ijson.items(f, 'hydroxyurea.item', use_float=True)
+        print("Processing hydroxyurea papers...")
 
-    # Process all papers
-    results = []
-    
-    for i, paper in enumerate(hydroxyurea_papers, 1):
-        print("Processing paper " + str(i) + "/" + str(len(hydroxyurea_papers)) + ": PMID " + str(paper.get('pmid')))
+        # Process all papers
+        results = []
+        with_efficacy = 0
+        
+        for i, paper in enumerate(papers_iter, 1):
+            print("Processing paper " + str(i) + ": PMID " + str(paper.get('pmid')))
         
-        try:
-            result = extract_basic_info(paper)
-            results.append(asdict(result))
+            try:
+                result = extract_basic_info(paper)
+                results.append(result.to_dict())
             
-            if result.has_efficacy_data:
-                print("    ✓ CMML + Hydroxyurea mentioned")
-            else:
-                print("    ○ Basic info extracted")
+                if result.has_efficacy_data:
+                    with_efficacy += 1
+                    print("    ✓ CMML + Hydroxyurea mentioned")
+                else:
+                    print("    ○ Basic info extracted")
                 
-        except Exception as e:
-            print("    ✗ Error: " + str(e))
-            continue
+            except Exception as e:
+                print("    ✗ Error: " + str(e))
+                continue
 
     # Save results
     output_file = 'Hydroxyurea_extracted.json'
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
 
     # Summary
-    with_efficacy = len([r for r in results if r.get('has_efficacy_data')])
     print("\n" + "="*60)
     print("HYDROXYUREA BASIC EXTRACTION COMPLETED")
     print("="*60)
@@ -6,17 +6,52 @@ Script to fetch ALL papers from both PubMed searches:
 And prepare them for comprehensive adverse event extraction
 """
 
-import requests
-import json
-import time
-import os
-from typing import List, Dict, Any
+import asyncio
+import aiohttp
+from eutils_session import NCBI_API_KEY, NCBI_RATE, SESSION
+import orjson
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+import pubmed_cache
+from rate_limiter import AsyncRateLimiter
+from typing import List, Dict, Any, Optional, Tuple
+
+class ChunkStream:
+    """Read-only file object over byte chunks handed over through a queue; None marks the end"""
+
+    def __init__(self, chunks: queue.Queue):
+        self.chunks = chunks
+        self.finished = False
+
+    def read(self, size: int = -1) -> bytes:
+        if self.finished:
+            return b''
+        chunk = self.chunks.get()
+        if chunk is None:
+            self.finished = True
+            return b''
+        return chunk
+
+    def drain(self):
+        """Discard chunks up to the end marker so the producer never blocks on a full queue"""
+        while self.read():
+            pass
 
 class ComprehensivePubMedFetcher:
     def __init__(self):
         self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
         self.tool = "CMML_Research"
         self.email = "research@example.com"
+        self.api_key = NCBI_API_KEY
+        # Shared by every request this fetcher makes, so concurrent searches
+        # together stay within NCBI's per-IP limit
+        self.rate_limiter = AsyncRateLimiter(NCBI_RATE, 1)
+        self.semaphore = asyncio.Semaphore(NCBI_RATE)
+        # Parsers block on their chunk queue, so they get their own pool with one thread per
+        # concurrent batch; on the default executor they could take every worker and starve
+        # the chunks.put calls that feed them
+        self.parse_executor = ThreadPoolExecutor(max_workers=NCBI_RATE)
         
     def search_pubmed(self, query: str, max_results: int = 500) -> List[str]:
         """Search PubMed and return PMIDs"""
@@ -27,11 +62,12 @@ class ComprehensivePubMedFetcher:
             'retmax': max_results,
             'retmode': 'json',
             'tool': self.tool,
-            'email': self.email
+            'email': self.email,
+            'api_key': self.api_key
         }
         
         try:
-            response = requests.get(search_url, params=params, timeout=30)
+            response = SESSION.get(search_url, params=params, timeout=30)
             response.raise_for_status()
             data = response.json()
             
@@ -47,128 +83,232 @@ class ComprehensivePubMedFetcher:
             print(f"Error searching PubMed: {e}")
             return []
     
-    def fetch_paper_details(self, pmid: str) -> Dict[str, Any]:
-        """Fetch detailed information for a single paper"""
-        fetch_url = f"{self.base_url}/efetch.fcgi"
-        params = {
+    async def search_pubmed_async(self, query: str, max_results: int = 500) -> List[str]:
+        """search_pubmed run in a worker thread under the shared rate limit"""
+        async with self.semaphore:
+            await self.rate_limiter.acquire()
+            return await asyncio.to_thread(self.search_pubmed, query, max_results)
+    
+    def _locate_fields(self, article: ET.Element) -> Tuple[Optional[ET.Element], Optional[ET.Element], Optional[ET.Element], Optional[ET.Element], List[ET.Element]]:
+        """Find the title, author list, journal title, pub date and abstract elements of an article"""
+        art = article.find('MedlineCitation/Article')
+        if art is None:
+            # Non-canonical record: fall back to generic descendant searches
+            return (article.find('.//ArticleTitle'), article.find('.//AuthorList'),
+                    article.find('.//Journal/Title'), article.find('.//PubDate'),
+                    article.findall('.//Abstract/AbstractText'))
+        
+        # Canonical efetch layout: one pass over <Article>'s children picks up every
+        # field instead of resolving a separate path from the root for each
+        title_elem = author_list = journal_elem = pub_date = None
+        abstract_texts = []
+        for child in art:
+            tag = child.tag
+            if tag == 'ArticleTitle':
+                title_elem = child
+            elif tag == 'AuthorList':
+                author_list = child
+            elif tag == 'Journal':
+                journal_elem = child.find('Title')
+                pub_date = child.find('JournalIssue/PubDate')
+            elif tag == 'Abstract':
+                abstract_texts = child.findall('AbstractText')
+        return title_elem, author_list, journal_elem, pub_date, abstract_texts
+    
+    def _parse_article(self, article: ET.Element) -> Dict[str, Any]:
+        """Extract paper details from one <PubmedArticle> element"""
+        pmid = article.findtext('MedlineCitation/PMID')
+        title_elem, author_list, journal_elem, pub_date, abstract_texts = self._locate_fields(article)
+        
+        # Extract basic information
+        paper_data = {
+            'pmid': pmid,
+            'title': '',
+            'authors': [],
+            'journal': '',
+            'publication_date': '',
+            'abstract': '',
+            'pmcid': None,
+            'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+        }
+        
+        # Extract title
+        if title_elem is not None:
+            paper_data['title'] = title_elem.text or ''
+        
+        # Extract authors
+        if author_list is not None:
+            authors = []
+            for author in author_list.findall("Author"):
+                last_name = author.find("LastName")
+                fore_name = author.find("ForeName")
+                if last_name is not None and fore_name is not None:
+                    authors.append(f"{fore_name.text} {last_name.text}")
+            paper_data['authors'] = authors
+        
+        # Extract journal info
+        if journal_elem is not None:
+            paper_data['journal'] = journal_elem.text or ''
+        
+        # Extract publication date
+        if pub_date is not None:
+            year = pub_date.find("Year")
+            month = pub_date.find("Month")
+            date_parts = []
+            if year is not None:
+                date_parts.append(year.text)
+            if month is not None:
+                date_parts.append(month.text)
+            paper_data['publication_date'] = ' '.join(date_parts)
+        
+        # Extract abstract (handle multiple AbstractText elements)
+        if abstract_texts:
+            abstract_parts = []
+            for abstract_text in abstract_texts:
+                if abstract_text.text:
+                    abstract_parts.append(abstract_text.text)
+            paper_data['abstract'] = ' '.join(abstract_parts)
+        
+        # Extract PMCID if available
+        pmcid_elem = article.find("PubmedData/ArticleIdList/ArticleId[@IdType='pmc']")
+        if pmcid_elem is not None:
+            paper_data['pmcid'] = pmcid_elem.text
+        
+        # Create citation
+        if paper_data['authors']:
+            first_author = paper_data['authors'][0]
+            if len(paper_data['authors']) > 1:
+                citation_authors = f"{first_author} et al."
+            else:
+                citation_authors = first_author
+        else:
+            citation_authors = "Unknown authors"
+        
+        paper_data['citation'] = f"{citation_authors} {paper_data['title']}. {paper_data['journal']} ({paper_data['publication_date']})"
+        
+        return paper_data
+    
+    def _error_paper(self, pmid: str) -> Dict[str, Any]:
+        """Placeholder record for a paper whose details could not be fetched"""
+        return {
+            'pmid': pmid,
+            'title': f'Error fetching title for PMID {pmid}',
+            'authors': [],
+            'journal': '',
+            'publication_date': '',
+            'abstract': '',
+            'pmcid': None,
+            'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+            'citation': f"PMID {pmid} (error fetching details)"
+        }
+    
+    def _collect_articles(self, events, fetched: Dict[str, Dict[str, Any]]):
+        """Parse each completed <PubmedArticle> from XML end events into `fetched`, keyed by PMID"""
+        for _, elem in events:
+            if elem.tag == 'PubmedArticle':
+                paper_data = self._parse_article(elem)
+                fetched[paper_data['pmid']] = paper_data
+                try:
+                    pubmed_cache.set(paper_data['pmid'], ET.tostring(elem))
+                except OSError as e:
+                    # The paper is already parsed; a rerun just refetches it
+                    print(f"Could not cache PMID {paper_data['pmid']}: {e}")
+                # Free the finished article so only one is held in memory at a time
+                elem.clear()
+    
+    def _parse_stream(self, stream: ChunkStream, fetched: Dict[str, Dict[str, Any]]):
+        """Consumer side of the async fetch pipeline; runs in a worker thread"""
+        try:
+            self._collect_articles(ET.iterparse(stream, events=('end',)), fetched)
+        finally:
+            stream.drain()
+    
+    def _cached_papers(self, pmids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """Split pmids into papers parsed from the disk cache and PMIDs that still need fetching"""
+        fetched = {}
+        missing = []
+        for pmid in pmids:
+            xml = pubmed_cache.get(pmid)
+            if xml is None:
+                missing.append(pmid)
+            else:
+                fetched[pmid] = self._parse_article(ET.fromstring(xml))
+        return fetched, missing
+    
+    def _in_order(self, pmids: List[str], fetched: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return papers in the input order; anything missing from the response gets a placeholder"""
+        papers = []
+        for pmid in pmids:
+            if pmid in fetched:
+                papers.append(fetched[pmid])
+            else:
+                print(f"Error fetching details for PMID {pmid}: not in efetch response")
+                papers.append(self._error_paper(pmid))
+        return papers
+    
+    def _efetch_data(self, pmids: List[str]) -> Dict[str, str]:
+        """Form body for an efetch request covering `pmids`"""
+        data = {
             'db': 'pubmed',
-            'id': pmid,
+            'id': ','.join(pmids),
             'retmode': 'xml',
             'tool': self.tool,
             'email': self.email
         }
+        if self.api_key:
+            data['api_key'] = self.api_key
+        return data
+    
+    async def _fetch_batch_async(self, session: aiohttp.ClientSession, pmids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch details for a batch of papers with one efetch request, bounded by the semaphore and rate limiter"""
+        fetch_url = f"{self.base_url}/efetch.fcgi"
         
-        try:
-            response = requests.get(fetch_url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            # Parse XML response
-            import xml.etree.ElementTree as ET
-            root = ET.fromstring(response.content)
-            
-            # Extract basic information
-            paper_data = {
-                'pmid': pmid,
-                'title': '',
-                'authors': [],
-                'journal': '',
-                'publication_date': '',
-                'abstract': '',
-                'pmcid': None,
-                'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-            }
-            
-            # Extract title
-            title_elem = root.find(".//ArticleTitle")
-            if title_elem is not None:
-                paper_data['title'] = title_elem.text or ''
-            
-            # Extract authors
-            author_list = root.find(".//AuthorList")
-            if author_list is not None:
-                authors = []
-                for author in author_list.findall("Author"):
-                    last_name = author.find("LastName")
-                    fore_name = author.find("ForeName")
-                    if last_name is not None and fore_name is not None:
-                        authors.append(f"{fore_name.text} {last_name.text}")
-                paper_data['authors'] = authors
-            
-            # Extract journal info
-            journal_elem = root.find(".//Journal/Title")
-            if journal_elem is not None:
-                paper_data['journal'] = journal_elem.text or ''
-            
-            # Extract publication date
-            pub_date = root.find(".//PubDate")
-            if pub_date is not None:
-                year = pub_date.find("Year")
-                month = pub_date.find("Month")
-                date_parts = []
-                if year is not None:
-                    date_parts.append(year.text)
-                if month is not None:
-                    date_parts.append(month.text)
-                paper_data['publication_date'] = ' '.join(date_parts)
-            
-            # Extract abstract (handle multiple AbstractText elements)
-            abstract_texts = root.findall(".//Abstract/AbstractText")
-            if abstract_texts:
-                abstract_parts = []
-                for abstract_text in abstract_texts:
-                    if abstract_text.text:
-                        abstract_parts.append(abstract_text.text)
-                paper_data['abstract'] = ' '.join(abstract_parts)
-            
-            # Extract PMCID if available
-            pmcid_elem = root.find(".//ArticleIdList/ArticleId[@IdType='pmc']")
-            if pmcid_elem is not None:
-                paper_data['pmcid'] = pmcid_elem.text
-            
-            # Create citation
-            if paper_data['authors']:
-                first_author = paper_data['authors'][0]
-                if len(paper_data['authors']) > 1:
-                    citation_authors = f"{first_author} et al."
-                else:
-                    citation_authors = first_author
-            else:
-                citation_authors = "Unknown authors"
-            
-            paper_data['citation'] = f"{citation_authors} {paper_data['title']}. {paper_data['journal']} ({paper_data['publication_date']})"
-            
-            return paper_data
-            
-        except Exception as e:
-            print(f"Error fetching details for PMID {pmid}: {e}")
-            return {
-                'pmid': pmid,
-                'title': f'Error fetching title for PMID {pmid}',
-                'authors': [],
-                'journal': '',
-                'publication_date': '',
-                'abstract': '',
-                'pmcid': None,
-                'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
-                'citation': f"PMID {pmid} (error fetching details)"
-            }
+        fetched, missing = self._cached_papers(pmids)
+        if missing:
+            async with self.semaphore:
+                await self.rate_limiter.acquire()
+                # Producer/consumer: this coroutine moves response chunks into a bounded
+                # queue while a worker thread parses them, so XML parsing overlaps the
+                # network wait and never blocks the event loop serving other batches
+                chunks = queue.Queue(maxsize=10)
+                parse_task = asyncio.get_running_loop().run_in_executor(
+                    self.parse_executor, self._parse_stream, ChunkStream(chunks), fetched)
+                try:
+                    try:
+                        async with session.post(fetch_url, data=self._efetch_data(missing)) as response:
+                            response.raise_for_status()
+                            async for chunk in response.content.iter_chunked(1 << 16):
+                                await asyncio.to_thread(chunks.put, chunk)
+                    finally:
+                        # End marker, then wait for the parser; a network error takes
+                        # precedence over the parse error a truncated body would cause
+                        await asyncio.to_thread(chunks.put, None)
+                        parse_result, = await asyncio.gather(parse_task, return_exceptions=True)
+                    if isinstance(parse_result, Exception):
+                        raise parse_result
+                    
+                except Exception as e:
+                    print(f"Error fetching details for {len(missing)} papers starting at PMID {missing[0]}: {e}")
+        
+        papers = self._in_order(pmids, fetched)
+        print(f"Fetched batch of {len(papers)} papers starting at PMID {pmids[0]} ({len(pmids) - len(missing)} from cache)")
+        return papers
     
-    def fetch_multiple_papers(self, pmids: List[str], delay: float = 0.15) -> List[Dict[str, Any]]:
-        """Fetch details for multiple papers with rate limiting"""
-        papers = []
+    async def fetch_multiple_papers(self, pmids: List[str], batch_size: int = 200) -> List[Dict[str, Any]]:
+        """Fetch details for multiple papers, running efetch batches concurrently within NCBI's rate limit"""
+        batches = [pmids[start:start + batch_size] for start in range(0, len(pmids), batch_size)]
         
-        for i, pmid in enumerate(pmids):
-            print(f"Fetching paper {i+1}/{len(pmids)}: PMID {pmid}")
-            paper_data = self.fetch_paper_details(pmid)
-            papers.append(paper_data)
-            
-            # Rate limiting to be respectful to NCBI servers
-            time.sleep(delay)
-            
-            # Progress update every 25 papers
-            if (i + 1) % 25 == 0:
-                print(f"Progress: {i+1}/{len(pmids)} papers fetched ({((i+1)/len(pmids)*100):.1f}%)")
+        connector = aiohttp.TCPConnector(limit=10)
+        timeout = aiohttp.ClientTimeout(total=60)
+        headers = {'User-Agent': 'CMML_Research'}
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            # gather keeps batch order, so papers come back in PMID order
+            results = await asyncio.gather(*[
+                self._fetch_batch_async(session, batch) for batch in batches
+            ])
         
+        papers = [paper for batch_papers in results for paper in batch_papers]
+        print(f"Progress: {len(papers)}/{len(pmids)} papers fetched ({(len(papers)/len(pmids)*100):.1f}%)")
         return papers
 
     def prepare_for_ae_extraction(self, paper: Dict[str, Any], drug: str, query: str) -> Dict[str, Any]:
@@ -202,7 +342,54 @@ class ComprehensivePubMedFetcher:
             'verification_url': paper['url']
         }
 
-def main():
+async def process_search(fetcher: ComprehensivePubMedFetcher, search_info: Dict[str, str]) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
+    """Search, fetch and save the papers for one drug; returns (drug, prepared papers or None)"""
+    query = search_info['query']
+    drug = search_info['drug']
+    output_file = search_info['output_file']
+    
+    print(f"\n{'='*60}")
+    print(f"SEARCHING FOR: {query}")
+    print(f"{'='*60}")
+    
+    # Search PubMed
+    pmids = await fetcher.search_pubmed_async(query, max_results=500)
+    
+    if not pmids:
+        print(f"No PMIDs found for {query}")
+        return drug, None
+    
+    print(f"Found {len(pmids)} papers for {drug}")
+    
+    # Fetch detailed information for each paper
+    print(f"Fetching detailed information for {len(pmids)} papers...")
+    papers = await fetcher.fetch_multiple_papers(pmids)
+    
+    # Prepare data for adverse event extraction
+    prepared_papers = []
+    for paper in papers:
+        prepared_paper = fetcher.prepare_for_ae_extraction(paper, drug, query)
+        prepared_papers.append(prepared_paper)
+    
+    # Organize by drug
+    drug_data = {drug: prepared_papers}
+    
+    # Save individual drug data
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(drug_data, option=orjson.OPT_INDENT_2))
+    
+    print(f"Saved {len(prepared_papers)} papers to {output_file}")
+    
+    # Print summary
+    papers_with_abstract = sum(1 for paper in papers if paper['abstract'])
+    papers_with_pmcid = sum(1 for paper in papers if paper['pmcid'])
+    
+    print(f"[{drug}] Papers with abstracts: {papers_with_abstract}/{len(papers)} ({papers_with_abstract/len(papers)*100:.1f}%)")
+    print(f"[{drug}] Papers with PMC ID: {papers_with_pmcid}/{len(papers)} ({papers_with_pmcid/len(papers)*100:.1f}%)")
+    
+    return drug, prepared_papers
+
+async def main():
     """Main function to fetch ALL papers from both searches"""
     
     fetcher = ComprehensivePubMedFetcher()
@@ -221,59 +408,15 @@ def main():
         }
     ]
     
-    all_data = {}
-    
-    for search_info in searches:
-        query = search_info['query']
-        drug = search_info['drug']
-        output_file = search_info['output_file']
-        
-        print(f"\n{'='*60}")
-        print(f"SEARCHING FOR: {query}")
-        print(f"{'='*60}")
-        
-        # Search PubMed
-        pmids = fetcher.search_pubmed(query, max_results=500)
-        
-        if not pmids:
-            print(f"No PMIDs found for {query}")
-            continue
-        
-        print(f"Found {len(pmids)} papers for {drug}")
-        
-        # Fetch detailed information for each paper
-        print(f"Fetching detailed information for {len(pmids)} papers...")
-        papers = fetcher.fetch_multiple_papers(pmids)
-        
-        # Prepare data for adverse event extraction
-        prepared_papers = []
-        for paper in papers:
-            prepared_paper = fetcher.prepare_for_ae_extraction(paper, drug, query)
-            prepared_papers.append(prepared_paper)
-        
-        # Organize by drug
-        drug_data = {drug: prepared_papers}
-        
-        # Save individual drug data
-        with open(output_file, 'w') as f:
-            json.dump(drug_data, f, indent=2)
-        
-        print(f"Saved {len(prepared_papers)} papers to {output_file}")
-        
-        # Add to combined data
-        all_data[drug] = prepared_papers
-        
-        # Print summary
-        papers_with_abstract = sum(1 for paper in papers if paper['abstract'])
-        papers_with_pmcid = sum(1 for paper in papers if paper['pmcid'])
-        
-        print(f"Papers with abstracts: {papers_with_abstract}/{len(papers)} ({papers_with_abstract/len(papers)*100:.1f}%)")
-        print(f"Papers with PMC ID: {papers_with_pmcid}/{len(papers)} ({papers_with_pmcid/len(papers)*100:.1f}%)")
+    # The searches are independent, so run them together; the fetcher's shared
+    # rate limiter keeps their combined request rate within NCBI's limit
+    results = await asyncio.gather(*[process_search(fetcher, search_info) for search_info in searches])
+    all_data = {drug: papers for drug, papers in results if papers is not None}
     
     # Save combined data
     combined_output = 'pubmed_all_cmml_papers.json'
-    with open(combined_output, 'w') as f:
-        json.dump(all_data, f, indent=2)
+    with open(combined_output, 'wb') as f:
+        f.write(orjson.dumps(all_data, option=orjson.OPT_INDENT_2))
     
     # Final summary
     total_papers = sum(len(papers) for papers in all_data.values())
@@ -293,4 +436,4 @@ def main():
             print(f"  {i+1}. PMID {paper['pmid']}: {paper['title'][:80]}...")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
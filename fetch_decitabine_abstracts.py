@@ -3,15 +3,19 @@
 Fetch detailed abstracts for decitabine CMML papers to extract adverse events
 """
 
-import requests
+from eutils_session import NCBI_API_KEY, REQUEST_DELAY, SESSION
 import time
-import json
+import orjson
 import re
 
+# MEDLINE abstract field (runs until the next tag, a blank line or the end) and whitespace runs
+_AB_RE = re.compile(r'AB\s+-\s+(.*?)(?=\n[A-Z]{2}\s+-|\n\n|\Z)', re.DOTALL)
+_WS_RE = re.compile(r'\s+')
+
 def fetch_decitabine_abstracts():
     # Load the decitabine papers
-    with open('Decitabine_extracted.json', 'r') as f:
-        papers = json.load(f)
+    with open('Decitabine_extracted.json', 'rb') as f:
+        papers = orjson.loads(f.read())
     
     print(f"Fetching detailed abstracts for {len(papers)} decitabine papers...")
     
@@ -28,18 +32,19 @@ def fetch_decitabine_abstracts():
                 'db': 'pubmed',
                 'id': pmid,
                 'retmode': 'text',
-                'rettype': 'medline'
+                'rettype': 'medline',
+                'api_key': NCBI_API_KEY
             }
-            fetch_response = requests.get(fetch_url, params=fetch_params)
+            fetch_response = SESSION.get(fetch_url, params=fetch_params)
             
             if fetch_response.status_code == 200:
                 text = fetch_response.text
                 # Extract abstract using regex
-                abstract_match = re.search(r'AB\s+-\s+(.*?)(?=\n[A-Z]{2}\s+-|\n\n|\Z)', text, re.DOTALL)
+                abstract_match = _AB_RE.search(text)
                 if abstract_match:
                     abstract = abstract_match.group(1).strip()
                     # Clean up the abstract
-                    abstract = re.sub(r'\s+', ' ', abstract)  # Replace multiple spaces with single space
+                    abstract = _WS_RE.sub(' ', abstract)  # Replace multiple spaces with single space
                     paper['abstract'] = abstract
                     print(f"   ✓ Abstract found: {len(abstract)} chars")
                 else:
@@ -49,12 +54,12 @@ def fetch_decitabine_abstracts():
         except Exception as e:
             print(f"   ✗ Error: {e}")
         
-        time.sleep(1)  # Rate limiting
+        time.sleep(REQUEST_DELAY)  # Rate limiting
     
     # Save the enhanced papers
     output_file = 'Decitabine_extracted_with_abstracts.json'
-    with open(output_file, 'w') as f:
-        json.dump(papers, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(papers, option=orjson.OPT_INDENT_2))
     
     print(f"\n💾 Saved papers with abstracts to {output_file}")
     
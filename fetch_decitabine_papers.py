@@ -4,11 +4,12 @@ Script to fetch papers from PubMed search for "chronic myelomonocytic leukemia D
 and prepare them for adverse event extraction
 """
 
-import requests
-import json
+from eutils_session import NCBI_API_KEY, REQUEST_DELAY, SESSION
+import orjson
 import time
-import os
-from typing import List, Dict, Any
+import xml.etree.ElementTree as ET
+import pubmed_cache
+from typing import List, Dict, Any, Tuple
 from urllib.parse import quote
 
 class PubMedFetcher:
@@ -16,6 +17,7 @@ class PubMedFetcher:
         self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
         self.tool = "CMML_Research"
         self.email = "research@example.com"
+        self.api_key = NCBI_API_KEY
         
     def search_pubmed(self, query: str, max_results: int = 100) -> List[str]:
         """Search PubMed and return PMIDs"""
@@ -26,11 +28,12 @@ class PubMedFetcher:
             'retmax': max_results,
             'retmode': 'json',
             'tool': self.tool,
-            'email': self.email
+            'email': self.email,
+            'api_key': self.api_key
         }
         
         try:
-            response = requests.get(search_url, params=params, timeout=30)
+            response = SESSION.get(search_url, params=params, timeout=30)
             response.raise_for_status()
             data = response.json()
             
@@ -44,108 +47,158 @@ class PubMedFetcher:
             print(f"Error searching PubMed: {e}")
             return []
     
-    def fetch_paper_details(self, pmid: str) -> Dict[str, Any]:
-        """Fetch detailed information for a single paper"""
+    def _parse_article(self, article: ET.Element) -> Dict[str, Any]:
+        """Extract paper details from one <PubmedArticle> element"""
+        # Direct child paths from <PubmedArticle> instead of `.//` descendant
+        # searches, so each lookup walks one branch rather than the whole article
+        pmid = article.findtext('MedlineCitation/PMID')
+        
+        # Extract basic information
+        paper_data = {
+            'pmid': pmid,
+            'title': '',
+            'authors': [],
+            'journal': '',
+            'publication_date': '',
+            'abstract': '',
+            'pmcid': None,
+            'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+        }
+        
+        # Extract title
+        title_elem = article.find('MedlineCitation/Article/ArticleTitle')
+        if title_elem is not None:
+            paper_data['title'] = title_elem.text or ''
+        
+        # Extract authors
+        author_list = article.find('MedlineCitation/Article/AuthorList')
+        if author_list is not None:
+            for author in author_list.findall("Author"):
+                last_name = author.find("LastName")
+                fore_name = author.find("ForeName")
+                if last_name is not None and fore_name is not None:
+                    paper_data['authors'].append(f"{fore_name.text} {last_name.text}")
+        
+        # Extract journal info
+        journal_elem = article.find('MedlineCitation/Article/Journal/Title')
+        if journal_elem is not None:
+            paper_data['journal'] = journal_elem.text or ''
+        
+        # Extract publication date
+        pub_date = article.find('MedlineCitation/Article/Journal/JournalIssue/PubDate')
+        if pub_date is not None:
+            year = pub_date.find("Year")
+            month = pub_date.find("Month")
+            if year is not None:
+                date_parts = [year.text]
+                if month is not None:
+                    date_parts.append(month.text)
+                paper_data['publication_date'] = ' '.join(date_parts)
+        
+        # Extract abstract
+        abstract_elem = article.find('MedlineCitation/Article/Abstract/AbstractText')
+        if abstract_elem is not None:
+            paper_data['abstract'] = abstract_elem.text or ''
+        
+        # Extract PMCID if available
+        pmcid_elem = article.find("PubmedData/ArticleIdList/ArticleId[@IdType='pmc']")
+        if pmcid_elem is not None:
+            paper_data['pmcid'] = pmcid_elem.text
+        
+        # Create citation
+        if paper_data['authors']:
+            first_author = paper_data['authors'][0]
+            paper_data['citation'] = f"{first_author} et al. {paper_data['title']}. {paper_data['journal']} ({paper_data['publication_date']})"
+        else:
+            paper_data['citation'] = f"{paper_data['title']}. {paper_data['journal']} ({paper_data['publication_date']})"
+        
+        return paper_data
+    
+    def _error_paper(self, pmid: str) -> Dict[str, Any]:
+        """Placeholder record for a paper whose details could not be fetched"""
+        return {
+            'pmid': pmid,
+            'title': '',
+            'authors': [],
+            'journal': '',
+            'publication_date': '',
+            'abstract': '',
+            'pmcid': None,
+            'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+            'citation': f"PMID {pmid}"
+        }
+    
+    def _cached_papers(self, pmids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """Split pmids into papers parsed from the disk cache and PMIDs that still need fetching"""
+        fetched = {}
+        missing = []
+        for pmid in pmids:
+            xml = pubmed_cache.get(pmid)
+            if xml is None:
+                missing.append(pmid)
+            else:
+                fetched[pmid] = self._parse_article(ET.fromstring(xml))
+        return fetched, missing
+    
+    def fetch_batch(self, pmids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch details for a batch of papers with a single efetch request"""
+        fetched, missing = self._cached_papers(pmids)
+        if not missing:
+            return [fetched[pmid] for pmid in pmids]
+        
         fetch_url = f"{self.base_url}/efetch.fcgi"
-        params = {
+        data = {
             'db': 'pubmed',
-            'id': pmid,
+            'id': ','.join(missing),
             'retmode': 'xml',
             'tool': self.tool,
-            'email': self.email
+            'email': self.email,
+            'api_key': self.api_key
         }
         
         try:
-            response = requests.get(fetch_url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            # Parse XML response
-            import xml.etree.ElementTree as ET
-            root = ET.fromstring(response.content)
-            
-            # Extract basic information
-            paper_data = {
-                'pmid': pmid,
-                'title': '',
-                'authors': [],
-                'journal': '',
-                'publication_date': '',
-                'abstract': '',
-                'pmcid': None,
-                'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-            }
-            
-            # Extract title
-            title_elem = root.find(".//ArticleTitle")
-            if title_elem is not None:
-                paper_data['title'] = title_elem.text or ''
-            
-            # Extract authors
-            author_list = root.find(".//AuthorList")
-            if author_list is not None:
-                for author in author_list.findall("Author"):
-                    last_name = author.find("LastName")
-                    fore_name = author.find("ForeName")
-                    if last_name is not None and fore_name is not None:
-                        paper_data['authors'].append(f"{fore_name.text} {last_name.text}")
-            
-            # Extract journal info
-            journal_elem = root.find(".//Journal/Title")
-            if journal_elem is not None:
-                paper_data['journal'] = journal_elem.text or ''
-            
-            # Extract publication date
-            pub_date = root.find(".//PubDate")
-            if pub_date is not None:
-                year = pub_date.find("Year")
-                month = pub_date.find("Month")
-                if year is not None:
-                    date_parts = [year.text]
-                    if month is not None:
-                        date_parts.append(month.text)
-                    paper_data['publication_date'] = ' '.join(date_parts)
-            
-            # Extract abstract
-            abstract_elem = root.find(".//Abstract/AbstractText")
-            if abstract_elem is not None:
-                paper_data['abstract'] = abstract_elem.text or ''
-            
-            # Extract PMCID if available
-            pmcid_elem = root.find(".//ArticleIdList/ArticleId[@IdType='pmc']")
-            if pmcid_elem is not None:
-                paper_data['pmcid'] = pmcid_elem.text
-            
-            # Create citation
-            if paper_data['authors']:
-                first_author = paper_data['authors'][0]
-                paper_data['citation'] = f"{first_author} et al. {paper_data['title']}. {paper_data['journal']} ({paper_data['publication_date']})"
-            else:
-                paper_data['citation'] = f"{paper_data['title']}. {paper_data['journal']} ({paper_data['publication_date']})"
-            
-            return paper_data
-            
+            # POST so long id lists don't hit URL length limits
+            with SESSION.post(fetch_url, data=data, timeout=60, stream=True) as response:
+                response.raise_for_status()
+                
+                # Stream-parse the (gunzipped) socket one article at a time,
+                # without first copying the whole body into a bytes object
+                response.raw.decode_content = True
+                for _, elem in ET.iterparse(response.raw, events=('end',)):
+                    if elem.tag == 'PubmedArticle':
+                        paper_data = self._parse_article(elem)
+                        fetched[paper_data['pmid']] = paper_data
+                        pubmed_cache.set(paper_data['pmid'], ET.tostring(elem))
+                        # Free the finished article so only one is held in memory at a time
+                        elem.clear()
+                
         except Exception as e:
-            print(f"Error fetching details for PMID {pmid}: {e}")
-            return {
-                'pmid': pmid,
-                'title': '',
-                'authors': [],
-                'journal': '',
-                'publication_date': '',
-                'abstract': '',
-                'pmcid': None,
-                'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
-                'citation': f"PMID {pmid}"
-            }
-    
-    def fetch_multiple_papers(self, pmids: List[str], delay: float = 0.1) -> List[Dict[str, Any]]:
-        """Fetch details for multiple papers with rate limiting"""
+            print(f"Error fetching details for {len(missing)} papers starting at PMID {missing[0]}: {e}")
+        
+        # Keep the input order; anything missing from the response gets a placeholder
+        papers = []
+        for pmid in pmids:
+            if pmid in fetched:
+                papers.append(fetched[pmid])
+            else:
+                print(f"Error fetching details for PMID {pmid}: not in efetch response")
+                papers.append(self._error_paper(pmid))
+        return papers
+    
+    def fetch_paper_details(self, pmid: str) -> Dict[str, Any]:
+        """Fetch detailed information for a single paper"""
+        return self.fetch_batch([pmid])[0]
+    
+    def fetch_multiple_papers(self, pmids: List[str], delay: float = None, batch_size: int = 200) -> List[Dict[str, Any]]:
+        """Fetch details for multiple papers in efetch batches with rate limiting"""
+        if delay is None:
+            delay = REQUEST_DELAY
         papers = []
         
-        for i, pmid in enumerate(pmids):
-            print(f"Fetching paper {i+1}/{len(pmids)}: PMID {pmid}")
-            paper_data = self.fetch_paper_details(pmid)
-            papers.append(paper_data)
+        for start in range(0, len(pmids), batch_size):
+            batch = pmids[start:start + batch_size]
+            print(f"Fetching papers {start+1}-{start+len(batch)}/{len(pmids)}")
+            papers.extend(self.fetch_batch(batch))
             
             # Rate limiting
             time.sleep(delay)
@@ -212,8 +265,8 @@ def main():
     
     # Save the fetched data
     output_file = 'pubmed_decitabine_cmml.json'
-    with open(output_file, 'w') as f:
-        json.dump(organized_data, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(organized_data, option=orjson.OPT_INDENT_2))
     
     print(f"\nFetched {len(papers)} papers and saved to {output_file}")
     
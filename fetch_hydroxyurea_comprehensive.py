@@ -4,56 +4,50 @@ Comprehensive hydroxyurea paper fetching for CMML
 Fetches papers using multiple search terms to get complete coverage
 """
 
-import requests
+from eutils_session import NCBI_API_KEY, REQUEST_DELAY, SESSION
 import time
-import json
+import orjson
 import re
 from urllib.parse import quote
 
+# "HU" is matched as a whole word so it also hits at the start/end of a field
+_HU_RE = re.compile(r'hydroxyurea|\bhu\b', re.IGNORECASE)
+_CMML_RE = re.compile(r'cmml|chronic myelomonocytic', re.IGNORECASE)
+
 def search_pubmed_comprehensive():
     base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
     
-    # Multiple search terms to ensure comprehensive coverage
-    search_terms = [
-        "cmml hydroxyurea",
-        "chronic myelomonocytic leukemia hydroxyurea", 
-        "CMML hydroxyurea",
-        "hydroxyurea chronic myelomonocytic leukemia",
-        "hydroxyurea CMML"
-    ]
-    
-    all_pmids = set()
-    
-    for search_term in search_terms:
-        print(f"\nSearching for: '{search_term}'")
-        
-        # Search for papers
-        search_url = f"{base_url}esearch.fcgi"
-        search_params = {
-            'db': 'pubmed',
-            'term': search_term,
-            'retmode': 'json',
-            'retmax': 1000,  # Get maximum results
-            'tool': 'cmml_research',
-            'email': 'research@example.com'
-        }
-        
-        try:
-            response = requests.get(search_url, params=search_params)
-            if response.status_code == 200:
-                data = response.json()
-                pmids = data['esearchresult'].get('idlist', [])
-                print(f"Found {len(pmids)} PMIDs for '{search_term}'")
-                all_pmids.update(pmids)
-            else:
-                print(f"Search failed for '{search_term}': HTTP {response.status_code}")
-        except Exception as e:
-            print(f"Error searching for '{search_term}': {e}")
-        
-        time.sleep(1)  # Rate limiting
-    
-    print(f"\nTotal unique PMIDs found: {len(all_pmids)}")
-    return list(all_pmids)
+    # PubMed is case-insensitive and ignores word order, so the old per-variant
+    # searches ("cmml hydroxyurea", "hydroxyurea CMML", ...) collapse into one OR query
+    search_term = '(CMML OR "chronic myelomonocytic leukemia") AND hydroxyurea'
+    print(f"\nSearching for: '{search_term}'")
+    
+    pmids = []
+    search_url = f"{base_url}esearch.fcgi"
+    search_params = {
+        'db': 'pubmed',
+        'term': search_term,
+        'retmode': 'json',
+        'retmax': 1000,  # Get maximum results
+        'tool': 'cmml_research',
+        'email': 'research@example.com',
+        'api_key': NCBI_API_KEY
+    }
+    
+    try:
+        response = SESSION.get(search_url, params=search_params)
+        if response.status_code == 200:
+            data = response.json()
+            pmids = data['esearchresult'].get('idlist', [])
+        else:
+            print(f"Search failed for '{search_term}': HTTP {response.status_code}")
+    except Exception as e:
+        print(f"Error searching for '{search_term}': {e}")
+    
+    # esearch returns each PMID once, but dedupe defensively while keeping order
+    pmids = list(dict.fromkeys(pmids))
+    print(f"\nTotal unique PMIDs found: {len(pmids)}")
+    return pmids
 
 def fetch_paper_details(pmids):
     base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
@@ -72,11 +66,12 @@ def fetch_paper_details(pmids):
             'id': ','.join(batch),
             'retmode': 'json',
             'tool': 'cmml_research',
-            'email': 'research@example.com'
+            'email': 'research@example.com',
+            'api_key': NCBI_API_KEY
         }
         
         try:
-            response = requests.get(summary_url, params=summary_params)
+            response = SESSION.get(summary_url, params=summary_params)
             if response.status_code == 200:
                 data = response.json()
                 
@@ -109,7 +104,7 @@ def fetch_paper_details(pmids):
         except Exception as e:
             print(f"Error fetching summaries: {e}")
         
-        time.sleep(1)  # Rate limiting
+        time.sleep(REQUEST_DELAY)  # Rate limiting
     
     return papers
 
@@ -118,21 +113,10 @@ def filter_hydroxyurea_papers(papers):
     filtered_papers = []
     
     for paper in papers:
-        title = paper.get('title', '').lower()
-        abstract = paper.get('abstract', '').lower()
-        citation = paper.get('citation', '').lower()
-        
-        # Check for hydroxyurea mentions
-        has_hydroxyurea = ('hydroxyurea' in title or 'hydroxyurea' in abstract or 
-                          'hydroxyurea' in citation)
-        has_hu = (' hu ' in title or ' hu ' in abstract or ' hu ' in citation)
-        
-        # Check for CMML mentions
-        has_cmml = ('cmml' in title or 'cmml' in abstract or 'cmml' in citation or
-                   'chronic myelomonocytic' in title or 'chronic myelomonocytic' in abstract or 
-                   'chronic myelomonocytic' in citation)
+        # One case-insensitive pass per pattern over all three fields
+        text = f"{paper.get('title', '')}\n{paper.get('abstract', '')}\n{paper.get('citation', '')}"
         
-        if (has_hydroxyurea or has_hu) and has_cmml:
+        if _HU_RE.search(text) and _CMML_RE.search(text):
             filtered_papers.append(paper)
             print(f"✓ Keeping PMID {paper['pmid']}: Contains hydroxyurea + CMML")
         else:
@@ -168,8 +152,8 @@ def main():
     
     # Step 4: Save results
     output_file = 'pubmed_hydroxyurea_cmml_comprehensive.json'
-    with open(output_file, 'w') as f:
-        json.dump(filtered_papers, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(filtered_papers, option=orjson.OPT_INDENT_2))
     
     print(f"\n💾 Saved {len(filtered_papers)} papers to {output_file}")
     
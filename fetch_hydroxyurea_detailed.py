@@ -3,58 +3,58 @@
 Fetch detailed abstracts for hydroxyurea CMML papers
 """
 
-import requests
-import time
-import json
-import re
+import asyncio
+import aiohttp
+import gzip
+import orjson
+from rate_limiter import AsyncRateLimiter
+from eutils_session import NCBI_RATE
+from medline_fetch import MEDLINE_BATCH_SIZE, parse_abstract, cached_records, fetch_medline_batch
 
-def fetch_detailed_abstracts():
+async def fetch_detailed_abstracts():
     # Load the comprehensive papers
-    with open('pubmed_hydroxyurea_cmml_comprehensive.json', 'r') as f:
-        papers = json.load(f)
+    with open('pubmed_hydroxyurea_cmml_comprehensive.json', 'rb') as f:
+        papers = orjson.loads(f.read())
     
     print(f"Fetching detailed abstracts for {len(papers)} papers...")
     
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+    # One pooled session; the semaphore and rate limiter keep us within NCBI's limit
+    pmids = [str(paper['pmid']) for paper in papers]
+    records, missing = cached_records(pmids)
+    if records:
+        print(f"Using {len(records)} cached MEDLINE records")
+    batches = [missing[start:start + MEDLINE_BATCH_SIZE] for start in range(0, len(missing), MEDLINE_BATCH_SIZE)]
+    rate_limiter = AsyncRateLimiter(NCBI_RATE, 1)
+    semaphore = asyncio.Semaphore(NCBI_RATE)
+    connector = aiohttp.TCPConnector(limit_per_host=NCBI_RATE, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results = await asyncio.gather(*[
+            fetch_medline_batch(session, rate_limiter, semaphore, batch) for batch in batches
+        ])
+    for batch_records in results:
+        records.update(batch_records)
     
     for i, paper in enumerate(papers):
-        pmid = paper['pmid']
+        pmid = str(paper['pmid'])
         print(f"\n{i+1}. Processing PMID {pmid}: {paper['title'][:60]}...")
         
-        # Fetch detailed abstract using MEDLINE format
-        try:
-            fetch_url = f"{base_url}efetch.fcgi"
-            fetch_params = {
-                'db': 'pubmed',
-                'id': pmid,
-                'retmode': 'text',
-                'rettype': 'medline'
-            }
-            fetch_response = requests.get(fetch_url, params=fetch_params)
-            
-            if fetch_response.status_code == 200:
-                text = fetch_response.text
-                # Extract abstract using regex
-                abstract_match = re.search(r'AB\s+-\s+(.*?)(?=\n[A-Z]{2}\s+-|\n\n|\Z)', text, re.DOTALL)
-                if abstract_match:
-                    abstract = abstract_match.group(1).strip()
-                    # Clean up the abstract
-                    abstract = re.sub(r'\s+', ' ', abstract)  # Replace multiple spaces with single space
-                    paper['abstract'] = abstract
-                    print(f"   ✓ Abstract found: {len(abstract)} chars")
-                else:
-                    print(f"   ✗ No abstract found")
-            else:
-                print(f"   ✗ Failed to fetch: HTTP {fetch_response.status_code}")
-        except Exception as e:
-            print(f"   ✗ Error: {e}")
+        text = records.get(pmid)
+        if text is None:
+            print(f"   ✗ Not in efetch response")
+            continue
         
-        time.sleep(1)  # Rate limiting
+        abstract = parse_abstract(text)
+        if abstract:
+            paper['abstract'] = abstract
+            print(f"   ✓ Abstract found: {len(abstract)} chars")
+        else:
+            print(f"   ✗ No abstract found")
     
     # Save the enhanced papers
-    output_file = 'pubmed_hydroxyurea_cmml_detailed.json'
-    with open(output_file, 'w') as f:
-        json.dump(papers, f, indent=2)
+    # Abstract-heavy and only read back by extract_hydroxyurea_comprehensive, so stored gzipped
+    output_file = 'pubmed_hydroxyurea_cmml_detailed.json.gz'
+    with gzip.open(output_file, 'wb', compresslevel=3) as f:
+        f.write(orjson.dumps(papers))
     
     print(f"\n💾 Saved detailed papers to {output_file}")
     
@@ -66,4 +66,4 @@ def fetch_detailed_abstracts():
         print(f"   Abstract: {abstract_length} characters")
 
 if __name__ == "__main__":
-    fetch_detailed_abstracts()
+    asyncio.run(fetch_detailed_abstracts())
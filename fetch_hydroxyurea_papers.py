@@ -3,55 +3,109 @@
 Fetch Hydroxyurea Papers from PubMed for CMML Treatment
 """
 
-import json
+import asyncio
+import aiohttp
+import orjson
+import sys
 import time
-import requests
-import re
 from typing import List, Dict, Any
+from rate_limiter import AsyncRateLimiter
+from eutils_session import NCBI_API_KEY, NCBI_RATE, REQUEST_DELAY, SESSION
+from medline_fetch import MEDLINE_BATCH_SIZE, parse_abstract, cached_records, fetch_medline_batch
 
-def search_pubmed(query: str, max_results: int = 100) -> List[Dict[str, Any]]:
-    """Search PubMed and return results."""
+# (connect, read) timeouts for the synchronous calls
+REQUEST_TIMEOUT = (3.05, 30)
+
+# Fetched batches waiting to be parsed; bounds memory if parsing falls behind
+PARSE_QUEUE_SIZE = 50
+
+async def parse_worker(parse_queue: asyncio.Queue, papers_by_pmid: Dict[str, Dict[str, Any]], fetched: set):
+    """Parse batches of MEDLINE records off the queue as they arrive until the None sentinel"""
+    while (records := await parse_queue.get()) is not None:
+        for pmid, text in records.items():
+            paper = papers_by_pmid.get(pmid)
+            if paper is None:
+                continue
+            fetched.add(pmid)
+            abstract = parse_abstract(text)
+            if abstract:
+                paper['abstract'] = abstract
+            else:
+                print(f"No abstract found for PMID {pmid}")
+
+async def fetch_abstracts(papers: List[Dict[str, Any]]):
+    """Fill in paper['abstract'] for all papers with batched, concurrent efetch calls"""
+    papers_by_pmid = {paper['pmid']: paper for paper in papers}
+    pmids = list(papers_by_pmid)
+    cached, missing = cached_records(pmids)
+    if cached:
+        print(f"Using {len(cached)} cached MEDLINE records")
+    batches = [missing[start:start + MEDLINE_BATCH_SIZE] for start in range(0, len(missing), MEDLINE_BATCH_SIZE)]
+    rate_limiter = AsyncRateLimiter(NCBI_RATE, 1)
+    semaphore = asyncio.Semaphore(NCBI_RATE)
+    
+    # Batches are parsed as soon as each one lands, overlapping with the fetches still in flight
+    parse_queue = asyncio.Queue(maxsize=PARSE_QUEUE_SIZE)
+    fetched = set()
+    parser = asyncio.create_task(parse_worker(parse_queue, papers_by_pmid, fetched))
+    await parse_queue.put(cached)
     
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+    async def produce(session: aiohttp.ClientSession, batch: List[str]):
+        await parse_queue.put(await fetch_medline_batch(session, rate_limiter, semaphore, batch))
     
-    # Search for papers
-    search_url = f"{base_url}esearch.fcgi"
+    connector = aiohttp.TCPConnector(limit_per_host=NCBI_RATE, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[produce(session, batch) for batch in batches])
+    await parse_queue.put(None)
+    await parser
+    
+    for pmid in pmids:
+        if pmid not in fetched:
+            print(f"Could not fetch abstract for PMID {pmid}: not in efetch response")
+
+BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+# esummary also takes a comma-separated id list, so it shares the efetch batch size
+SUMMARY_BATCH_SIZE = 200
+
+def search_pmids(query: str, max_results: int = 100) -> List[str]:
+    """Search PubMed and return the matching PMIDs"""
     search_params = {
         'db': 'pubmed',
         'term': query,
         'retmax': max_results,
         'retmode': 'json',
-        'sort': 'relevance'
+        'sort': 'relevance',
+        'api_key': NCBI_API_KEY  # requests drops None-valued params, so it is only sent when set
     }
     
     try:
-        response = requests.get(search_url, params=search_params)
+        response = SESSION.get(f"{BASE_URL}esearch.fcgi", params=search_params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        search_data = response.json()
-        
-        # Extract PMIDs
-        id_list = search_data.get('esearchresult', {}).get('idlist', [])
+        id_list = response.json().get('esearchresult', {}).get('idlist', [])
         print(f"Found {len(id_list)} papers for query: {query}")
-        
-        if not id_list:
-            return []
-        
-        # Fetch details for each paper
-        papers = []
-        batch_size = 20  # Process in batches to avoid overwhelming the API
-        
-        for i in range(0, len(id_list), batch_size):
-            batch_ids = id_list[i:i + batch_size]
+        return id_list
+    except Exception as e:
+        print(f"Error searching PubMed: {e}")
+        return []
+
+def fetch_papers(id_list: List[str]) -> List[Dict[str, Any]]:
+    """Fetch summaries and abstracts for a list of PMIDs"""
+    papers = []
+    
+    try:
+        for i in range(0, len(id_list), SUMMARY_BATCH_SIZE):
+            batch_ids = id_list[i:i + SUMMARY_BATCH_SIZE]
             
             # Fetch summary data
-            summary_url = f"{base_url}esummary.fcgi"
             summary_params = {
                 'db': 'pubmed',
                 'id': ','.join(batch_ids),
-                'retmode': 'json'
+                'retmode': 'json',
+                'api_key': NCBI_API_KEY
             }
             
-            response = requests.get(summary_url, params=summary_params)
+            response = SESSION.get(f"{BASE_URL}esummary.fcgi", params=summary_params, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             summary_data = response.json()
             
@@ -64,7 +118,7 @@ def search_pubmed(query: str, max_results: int = 100) -> List[Dict[str, Any]]:
                     paper = {
                         'pmid': pmid,
                         'title': paper_data.get('title', ''),
-                        'abstract': '',  # Will be filled below
+                        'abstract': '',  # Filled in by fetch_abstracts
                         'journal': paper_data.get('fulljournalname', ''),
                         'publication_date': paper_data.get('pubdate', ''),
                         'authors': paper_data.get('authors', []),
@@ -73,42 +127,17 @@ def search_pubmed(query: str, max_results: int = 100) -> List[Dict[str, Any]]:
                         'drug': 'hydroxyurea'
                     }
                     
-                    # Fetch abstract using MEDLINE format
-                    try:
-                        fetch_url = f"{base_url}efetch.fcgi"
-                        fetch_params = {
-                            'db': 'pubmed',
-                            'id': pmid,
-                            'retmode': 'text',
-                            'rettype': 'medline'
-                        }
-                        fetch_response = requests.get(fetch_url, params=fetch_params)
-                        if fetch_response.status_code == 200:
-                            text = fetch_response.text
-                            # Extract abstract using regex
-                            abstract_match = re.search(r'AB\s+-\s+(.*?)(?=\n[A-Z]{2}\s+-|\n\n|\Z)', text, re.DOTALL)
-                            if abstract_match:
-                                abstract = abstract_match.group(1).strip()
-                                # Clean up the abstract
-                                abstract = re.sub(r'\s+', ' ', abstract)  # Replace multiple spaces with single space
-                                paper['abstract'] = abstract
-                            else:
-                                print(f"No abstract found for PMID {pmid}")
-                        else:
-                            print(f"Failed to fetch abstract for PMID {pmid}: HTTP {fetch_response.status_code}")
-                    except Exception as e:
-                        print(f"Could not fetch abstract for PMID {pmid}: {e}")
-                    
                     papers.append(paper)
             
-            # Rate limiting
-            time.sleep(1)
-        
-        return papers
-        
+            time.sleep(REQUEST_DELAY)  # Rate limiting
     except Exception as e:
-        print(f"Error searching PubMed: {e}")
+        print(f"Error fetching paper summaries: {e}")
         return []
+    
+    # Abstracts are fetched in efetch batches of up to 200 rather than one call per paper
+    asyncio.run(fetch_abstracts(papers))
+    
+    return papers
 
 def main():
     # Search queries for hydroxyurea and CMML
@@ -120,29 +149,33 @@ def main():
         "myelomonocytic leukemia hydroxyurea"
     ]
     
-    all_papers = []
+    # Phase 1: collect PMIDs from every (cheap) esearch, deduplicated in first-seen order
+    unique_pmids = []
     seen_pmids = set()
     
     for query in search_queries:
         print(f"\nSearching for: {query}")
-        papers = search_pubmed(query, max_results=50)
-        
-        # Deduplicate by PMID
-        for paper in papers:
-            if paper['pmid'] not in seen_pmids:
-                all_papers.append(paper)
-                seen_pmids.add(paper['pmid'])
+        for pmid in search_pmids(query, max_results=50):
+            # Interned so the repeated membership checks across queries compare by identity
+            pmid = sys.intern(pmid)
+            if pmid not in seen_pmids:
+                unique_pmids.append(pmid)
+                seen_pmids.add(pmid)
         
-        print(f"Total unique papers so far: {len(all_papers)}")
-        time.sleep(2)  # Rate limiting between searches
+        print(f"Total unique papers so far: {len(unique_pmids)}")
+        time.sleep(REQUEST_DELAY)  # Rate limiting between searches
+    
+    # Phase 2: one batched summary/abstract fetch, so overlapping queries cost nothing extra
+    print(f"\nFetching details for {len(unique_pmids)} unique papers...")
+    all_papers = fetch_papers(unique_pmids)
     
-    # Save results
+    # Save results (compact: only read back by the extraction scripts)
     output_data = {
         'hydroxyurea': all_papers
     }
     
-    with open('pubmed_hydroxyurea_cmml.json', 'w') as f:
-        json.dump(output_data, f, indent=2)
+    with open('pubmed_hydroxyurea_cmml.json', 'wb') as f:
+        f.write(orjson.dumps(output_data))
     
     print(f"\nSaved {len(all_papers)} unique hydroxyurea papers to pubmed_hydroxyurea_cmml.json")
     
@@ -3,64 +3,28 @@
 Fix complex object values in the data that are causing [object Object]% display issues
 """
 
-import json
-import statistics
+import ijson
+import numpy as np
+import orjson
+import dashboard_cache
+from numeric_values import extract_numeric_value
 
-def extract_single_value(value):
-    """Extract a single numeric value from complex data structures"""
-    if value is None:
-        return None
-    if isinstance(value, (int, float)):
-        return float(value)
-    if isinstance(value, str):
-        try:
-            return float(value.replace('%', ''))
-        except:
-            return None
-    if isinstance(value, dict):
-        # For cases like {'DEC-C': 64.0, 'DEC-C-Ven': 90.0}
-        # Take the average of all numeric values
-        values = [v for v in value.values() if isinstance(v, (int, float))]
-        if values:
-            return statistics.mean(values)
-        return None
-    if isinstance(value, list):
-        # For cases where it's a list of numbers
-        values = [v for v in value if isinstance(v, (int, float))]
-        if values:
-            return statistics.mean(values)
-        return None
-    return None
+# Efficacy fields that may hold dicts/lists/strings and are reduced to a single number
+_CLEAN_KEYS = ('overall_response_rate', 'complete_response', 'progression_free_survival_median', 'overall_survival_median')
 
 def clean_decitabine_data():
     """Clean the Decitabine data to fix complex object values"""
-    with open('Decitabine_extracted.json', 'r') as f:
-        data = json.load(f)
-    
+    # Stream the papers one at a time instead of loading the whole array first
     cleaned_data = []
-    for paper in data:
-        cleaned_paper = paper.copy()
-        
-        # Clean ORR values
-        if 'overall_response_rate' in cleaned_paper:
-            cleaned_paper['overall_response_rate'] = extract_single_value(cleaned_paper['overall_response_rate'])
-        
-        # Clean CR values
-        if 'complete_response' in cleaned_paper:
-            cleaned_paper['complete_response'] = extract_single_value(cleaned_paper['complete_response'])
-        
-        # Clean survival values
-        if 'progression_free_survival_median' in cleaned_paper:
-            cleaned_paper['progression_free_survival_median'] = extract_single_value(cleaned_paper['progression_free_survival_median'])
-        
-        if 'overall_survival_median' in cleaned_paper:
-            cleaned_paper['overall_survival_median'] = extract_single_value(cleaned_paper['overall_survival_median'])
-        
-        cleaned_data.append(cleaned_paper)
+    with open('Decitabine_extracted.json', 'rb') as f:
+        for paper in ijson.items(f, 'item', use_float=True):
+            # Overwrite only the value fields that are present; everything else is shared as-is
+            cleaned_paper = {**paper, **{key: extract_numeric_value(paper[key]) for key in _CLEAN_KEYS if key in paper}}
+            cleaned_data.append(cleaned_paper)
     
     # Save cleaned data
-    with open('Decitabine_extracted_cleaned.json', 'w') as f:
-        json.dump(cleaned_data, f, indent=2)
+    with open('Decitabine_extracted_cleaned.json', 'wb') as f:
+        f.write(orjson.dumps(cleaned_data, option=orjson.OPT_INDENT_2))
     
     print(f"✅ Cleaned Decitabine data - saved to Decitabine_extracted_cleaned.json")
     
@@ -82,20 +46,20 @@ def update_dashboard_with_cleaned_data():
     papers_with_data = [p for p in cleaned_decitabine if p.get('has_efficacy_data')]
     
     # Extract values
-    cr_values = [p.get('complete_response') for p in papers_with_data if p.get('complete_response') is not None]
-    orr_values = [p.get('overall_response_rate') for p in papers_with_data if p.get('overall_response_rate') is not None]
-    pfs_values = [p.get('progression_free_survival_median') for p in papers_with_data if p.get('progression_free_survival_median') is not None]
-    os_values = [p.get('overall_survival_median') for p in papers_with_data if p.get('overall_survival_median') is not None]
+    cr_values = [v for p in papers_with_data if (v := p.get('complete_response')) is not None]
+    orr_values = [v for p in papers_with_data if (v := p.get('overall_response_rate')) is not None]
+    pfs_values = [v for p in papers_with_data if (v := p.get('progression_free_survival_median')) is not None]
+    os_values = [v for p in papers_with_data if (v := p.get('overall_survival_median')) is not None]
     
     # Calculate statistics
-    cr_mean = round(statistics.mean(cr_values), 1) if cr_values else None
-    cr_median = round(statistics.median(cr_values), 1) if cr_values else None
-    orr_mean = round(statistics.mean(orr_values), 1) if orr_values else None
-    orr_median = round(statistics.median(orr_values), 1) if orr_values else None
-    pfs_mean = round(statistics.mean(pfs_values), 1) if pfs_values else None
-    pfs_median = round(statistics.median(pfs_values), 1) if pfs_values else None
-    os_mean = round(statistics.mean(os_values), 1) if os_values else None
-    os_median = round(statistics.median(os_values), 1) if os_values else None
+    cr_mean = round(float(np.mean(cr_values)), 1) if cr_values else None
+    cr_median = round(float(np.median(cr_values)), 1) if cr_values else None
+    orr_mean = round(float(np.mean(orr_values)), 1) if orr_values else None
+    orr_median = round(float(np.median(orr_values)), 1) if orr_values else None
+    pfs_mean = round(float(np.mean(pfs_values)), 1) if pfs_values else None
+    pfs_median = round(float(np.median(pfs_values)), 1) if pfs_values else None
+    os_mean = round(float(np.mean(os_values)), 1) if os_values else None
+    os_median = round(float(np.median(os_values)), 1) if os_values else None
     
     print(f"\nUpdated Decitabine Statistics:")
     print(f"  CR - Mean: {cr_mean}, Median: {cr_median} (from {len(cr_values)} papers)")
@@ -104,8 +68,7 @@ def update_dashboard_with_cleaned_data():
     print(f"  OS - Mean: {os_mean}, Median: {os_median} (from {len(os_values)} papers)")
     
     # Update dashboard data
-    with open('updated_dashboard_data.json', 'r') as f:
-        dashboard_data = json.load(f)
+    dashboard_data = dashboard_cache.load()
     
     dashboard_data['decitabine']['efficacy'] = {
         'cr_mean': cr_mean,
@@ -121,11 +84,9 @@ def update_dashboard_with_cleaned_data():
         'os_median': os_median
     }
     
-    # Save updated dashboard data
-    with open('updated_dashboard_data.json', 'w') as f:
-        json.dump(dashboard_data, f, indent=2)
-    
     print(f"\n✅ Updated dashboard data with cleaned Decitabine statistics!")
 
 if __name__ == "__main__":
     update_dashboard_with_cleaned_data()
+    # Written once, after every update to the shared dashboard dict
+    dashboard_cache.save()
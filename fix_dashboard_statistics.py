@@ -3,224 +3,115 @@
 Fix dashboard statistics by recalculating means/medians and deduplicating papers
 """
 
-import json
-import statistics
-from collections import defaultdict
-
-def extract_numeric_value(value):
-    """Extract numeric value from various data formats"""
-    if value is None:
-        return None
-    if isinstance(value, (int, float)):
-        return float(value)
-    if isinstance(value, str):
-        try:
-            return float(value.replace('%', ''))
-        except:
-            return None
-    if isinstance(value, dict):
-        # Handle cases like {'DEC-C': 64.0, 'DEC-C-Ven': 90.0}
-        values = [v for v in value.values() if isinstance(v, (int, float))]
-        return statistics.mean(values) if values else None
-    return None
+import ijson
+import sys
+import numpy as np
+import dashboard_cache
+from numeric_values import extract_numeric_value
+from concurrent.futures import ThreadPoolExecutor
 
 def calculate_statistics(values):
-    """Calculate mean and median from a list of values"""
+    """Calculate mean and median from a list of already-extracted floats"""
     if not values:
         return None, None
     
-    valid_values = [v for v in values if v is not None and not (isinstance(v, str) and v.lower() in ['na', 'n/a', ''])]
-    
-    if not valid_values:
-        return None, None
-    
-    try:
-        mean_val = statistics.mean(valid_values)
-        median_val = statistics.median(valid_values)
-        return round(mean_val, 1), round(median_val, 1)
-    except:
-        return None, None
+    arr = np.asarray(values, dtype=np.float64)
+    return round(float(arr.mean()), 1), round(float(np.median(arr)), 1)
 
-def analyze_azacitidine_data():
-    """Analyze Azacitidine clinical efficacy data"""
-    with open('clinical_efficacy_azacitidine.json', 'r') as f:
-        data = json.load(f)
-    
-    papers_with_data = [p for p in data if p.get('has_efficacy_data')]
-    
-    # Extract values
-    cr_values = [extract_numeric_value(p.get('complete_response')) for p in papers_with_data]
-    orr_values = [extract_numeric_value(p.get('overall_response_rate')) for p in papers_with_data]
-    pfs_values = [extract_numeric_value(p.get('progression_free_survival_median')) for p in papers_with_data]
-    os_values = [extract_numeric_value(p.get('overall_survival_median')) for p in papers_with_data]
-    
-    # Calculate statistics
-    cr_mean, cr_median = calculate_statistics(cr_values)
-    orr_mean, orr_median = calculate_statistics(orr_values)
-    pfs_mean, pfs_median = calculate_statistics(pfs_values)
-    os_mean, os_median = calculate_statistics(os_values)
-    
-    print(f"Azacitidine Analysis:")
-    print(f"  Papers with efficacy data: {len(papers_with_data)}")
-    print(f"  CR - Mean: {cr_mean}, Median: {cr_median} (from {len([v for v in cr_values if v is not None])} papers)")
-    print(f"  ORR - Mean: {orr_mean}, Median: {orr_median} (from {len([v for v in orr_values if v is not None])} papers)")
-    print(f"  PFS - Mean: {pfs_mean}, Median: {pfs_median} (from {len([v for v in pfs_values if v is not None])} papers)")
-    print(f"  OS - Mean: {os_mean}, Median: {os_median} (from {len([v for v in os_values if v is not None])} papers)")
-    
-    return {
-        'efficacy': {
-            'cr_mean': cr_mean,
-            'cr_median': cr_median,
-            'orr_mean': orr_mean,
-            'orr_median': orr_median
-        },
-        'survival': {
-            'pfs_mean': pfs_mean,
-            'pfs_median': pfs_median,
-            'os_mean': os_mean,
-            'os_median': os_median
-        }
-    }
+# Efficacy fields summarised on the dashboard, keyed by the prefix of their statistics
+METRICS = {
+    'cr': 'complete_response',
+    'orr': 'overall_response_rate',
+    'pfs': 'progression_free_survival_median',
+    'os': 'overall_survival_median'
+}
 
-def analyze_decitabine_data():
-    """Analyze Decitabine clinical efficacy data"""
-    with open('Decitabine_extracted.json', 'r') as f:
-        data = json.load(f)
-    
-    papers_with_data = [p for p in data if p.get('has_efficacy_data')]
-    
-    # Extract values
-    cr_values = [extract_numeric_value(p.get('complete_response')) for p in papers_with_data]
-    orr_values = [extract_numeric_value(p.get('overall_response_rate')) for p in papers_with_data]
-    pfs_values = [extract_numeric_value(p.get('progression_free_survival_median')) for p in papers_with_data]
-    os_values = [extract_numeric_value(p.get('overall_survival_median')) for p in papers_with_data]
+def analyze(drug, path):
+    """Analyze one drug's clinical efficacy data in a single pass over its papers"""
+    values = {prefix: [] for prefix in METRICS}
+    papers_with_data = 0
+    
+    # Stream the papers; only the extracted numbers of those with efficacy data are kept
+    with open(path, 'rb') as f:
+        for paper in ijson.items(f, 'item', use_float=True):
+            if not paper.get('has_efficacy_data'):
+                continue
+            papers_with_data += 1
+            for prefix, key in METRICS.items():
+                # Missing metrics are skipped without a call into extract_numeric_value
+                if (raw := paper.get(key)) is not None and (value := extract_numeric_value(raw)) is not None:
+                    values[prefix].append(value)
     
     # Calculate statistics
-    cr_mean, cr_median = calculate_statistics(cr_values)
-    orr_mean, orr_median = calculate_statistics(orr_values)
-    pfs_mean, pfs_median = calculate_statistics(pfs_values)
-    os_mean, os_median = calculate_statistics(os_values)
-    
-    print(f"\nDecitabine Analysis:")
-    print(f"  Papers with efficacy data: {len(papers_with_data)}")
-    print(f"  CR - Mean: {cr_mean}, Median: {cr_median} (from {len([v for v in cr_values if v is not None])} papers)")
-    print(f"  ORR - Mean: {orr_mean}, Median: {orr_median} (from {len([v for v in orr_values if v is not None])} papers)")
-    print(f"  PFS - Mean: {pfs_mean}, Median: {pfs_median} (from {len([v for v in pfs_values if v is not None])} papers)")
-    print(f"  OS - Mean: {os_mean}, Median: {os_median} (from {len([v for v in os_values if v is not None])} papers)")
+    stats = {}
+    print(f"\n{drug} Analysis:")
+    print(f"  Papers with efficacy data: {papers_with_data}")
+    for prefix, prefix_values in values.items():
+        mean, median = calculate_statistics(prefix_values)
+        stats[f'{prefix}_mean'] = mean
+        stats[f'{prefix}_median'] = median
+        print(f"  {prefix.upper()} - Mean: {mean}, Median: {median} (from {len(prefix_values)} papers)")
     
     return {
         'efficacy': {
-            'cr_mean': cr_mean,
-            'cr_median': cr_median,
-            'orr_mean': orr_mean,
-            'orr_median': orr_median
+            'cr_mean': stats['cr_mean'],
+            'cr_median': stats['cr_median'],
+            'orr_mean': stats['orr_mean'],
+            'orr_median': stats['orr_median']
         },
         'survival': {
-            'pfs_mean': pfs_mean,
-            'pfs_median': pfs_median,
-            'os_mean': os_mean,
-            'os_median': os_median
+            'pfs_mean': stats['pfs_mean'],
+            'pfs_median': stats['pfs_median'],
+            'os_mean': stats['os_mean'],
+            'os_median': stats['os_median']
         }
     }
 
-def analyze_hydroxyurea_data():
-    """Analyze Hydroxyurea clinical efficacy data"""
-    with open('Hydroxyurea_extracted.json', 'r') as f:
-        data = json.load(f)
-    
-    papers_with_data = [p for p in data if p.get('has_efficacy_data')]
-    
-    # Extract values
-    cr_values = [extract_numeric_value(p.get('complete_response')) for p in papers_with_data]
-    orr_values = [extract_numeric_value(p.get('overall_response_rate')) for p in papers_with_data]
-    pfs_values = [extract_numeric_value(p.get('progression_free_survival_median')) for p in papers_with_data]
-    os_values = [extract_numeric_value(p.get('overall_survival_median')) for p in papers_with_data]
-    
-    # Calculate statistics
-    cr_mean, cr_median = calculate_statistics(cr_values)
-    orr_mean, orr_median = calculate_statistics(orr_values)
-    pfs_mean, pfs_median = calculate_statistics(pfs_values)
-    os_mean, os_median = calculate_statistics(os_values)
-    
-    print(f"\nHydroxyurea Analysis:")
-    print(f"  Papers with efficacy data: {len(papers_with_data)}")
-    print(f"  CR - Mean: {cr_mean}, Median: {cr_median} (from {len([v for v in cr_values if v is not None])} papers)")
-    print(f"  ORR - Mean: {orr_mean}, Median: {orr_median} (from {len([v for v in orr_values if v is not None])} papers)")
-    print(f"  PFS - Mean: {pfs_mean}, Median: {pfs_median} (from {len([v for v in pfs_values if v is not None])} papers)")
-    print(f"  OS - Mean: {os_mean}, Median: {os_median} (from {len([v for v in os_values if v is not None])} papers)")
-    
-    return {
-        'efficacy': {
-            'cr_mean': cr_mean,
-            'cr_median': cr_median,
-            'orr_mean': orr_mean,
-            'orr_median': orr_median
-        },
-        'survival': {
-            'pfs_mean': pfs_mean,
-            'pfs_median': pfs_median,
-            'os_mean': os_mean,
-            'os_median': os_median
-        }
-    }
+# Extracted data file of each drug on the dashboard
+DRUG_FILES = {
+    'azacitidine': 'clinical_efficacy_azacitidine.json',
+    'decitabine': 'Decitabine_extracted.json',
+    'hydroxyurea': 'Hydroxyurea_extracted.json'
+}
+
+def load_pmids(path):
+    """Return the frozen set of PMIDs in an extracted data file"""
+    # Only the pmid of each paper is parsed out of the streamed file; interning lets
+    # the per-drug sets share one string object for a PMID that appears in several
+    with open(path, 'rb') as f:
+        return frozenset(sys.intern(str(pmid)) for pmid in ijson.items(f, 'item.pmid') if pmid)
 
 def count_unique_papers():
     """Count unique papers across all datasets"""
-    all_pmids = set()
-    drug_pmids = defaultdict(set)
-    
-    # Azacitidine
-    with open('clinical_efficacy_azacitidine.json', 'r') as f:
-        data = json.load(f)
-    for paper in data:
-        pmid = paper.get('pmid')
-        if pmid:
-            all_pmids.add(pmid)
-            drug_pmids['azacitidine'].add(pmid)
-    
-    # Decitabine
-    with open('Decitabine_extracted.json', 'r') as f:
-        data = json.load(f)
-    for paper in data:
-        pmid = paper.get('pmid')
-        if pmid:
-            all_pmids.add(pmid)
-            drug_pmids['decitabine'].add(pmid)
-    
-    # Hydroxyurea
-    with open('Hydroxyurea_extracted.json', 'r') as f:
-        data = json.load(f)
-    for paper in data:
-        pmid = paper.get('pmid')
-        if pmid:
-            all_pmids.add(pmid)
-            drug_pmids['hydroxyurea'].add(pmid)
+    # The three files are independent disk reads, so load them concurrently
+    with ThreadPoolExecutor(max_workers=len(DRUG_FILES)) as executor:
+        drug_pmids = dict(zip(DRUG_FILES, executor.map(load_pmids, DRUG_FILES.values())))
+    total_unique = len(set().union(*drug_pmids.values()))
     
     print(f"\nUnique Paper Counts:")
     print(f"  Azacitidine: {len(drug_pmids['azacitidine'])} unique papers")
     print(f"  Decitabine: {len(drug_pmids['decitabine'])} unique papers")
     print(f"  Hydroxyurea: {len(drug_pmids['hydroxyurea'])} unique papers")
-    print(f"  Total unique papers: {len(all_pmids)}")
+    print(f"  Total unique papers: {total_unique}")
     
     return {
         'azacitidine': len(drug_pmids['azacitidine']),
         'decitabine': len(drug_pmids['decitabine']),
         'hydroxyurea': len(drug_pmids['hydroxyurea']),
-        'total_unique': len(all_pmids)
+        'total_unique': total_unique
     }
 
 def update_dashboard_data():
     """Update the dashboard data with corrected statistics"""
     
     # Analyze data
-    azacitidine_stats = analyze_azacitidine_data()
-    decitabine_stats = analyze_decitabine_data()
-    hydroxyurea_stats = analyze_hydroxyurea_data()
+    azacitidine_stats = analyze('Azacitidine', 'clinical_efficacy_azacitidine.json')
+    decitabine_stats = analyze('Decitabine', 'Decitabine_extracted.json')
+    hydroxyurea_stats = analyze('Hydroxyurea', 'Hydroxyurea_extracted.json')
     unique_counts = count_unique_papers()
     
     # Load current dashboard data
-    with open('updated_dashboard_data.json', 'r') as f:
-        dashboard_data = json.load(f)
+    dashboard_data = dashboard_cache.load()
     
     # Update statistics
     dashboard_data['azacitidine'].update(azacitidine_stats)
@@ -235,11 +126,9 @@ def update_dashboard_data():
         'total_comprehensive': unique_counts['total_unique']
     }
     
-    # Save updated data
-    with open('updated_dashboard_data.json', 'w') as f:
-        json.dump(dashboard_data, f, indent=2)
-    
     print(f"\n✅ Updated dashboard data with corrected statistics!")
 
 if __name__ == "__main__":
     update_dashboard_data()
+    # Written once, after every update to the shared dashboard dict
+    dashboard_cache.save()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Schema-validated Gemini extraction over PubMed papers, shared by the async extractors
+Calls go to the REST endpoint through llm_cache, paced by a token bucket and a semaphore
+"""
+
+import io
+import gzip
+import mmap
+import asyncio
+import os
+import re
+import hashlib
+import orjson
+import msgspec
+import aiohttp
+import llm_cache
+from rate_limiter import AsyncRateLimiter
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+from typing import List, Optional, Union
+
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+
+MAX_CONCURRENT = 8
+
+# Inputs at least this large are memory-mapped instead of read into a bytes copy
+MMAP_THRESHOLD = 1 << 20
+
+def load_json(path: str):
+    """Parse a JSON file with orjson, straight from a memory map when it is large"""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            return orjson.loads(f.read())
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+        finally:
+            mm.close()
+
+class JsonArrayWriter:
+    """Write records to a JSON array file as they arrive so a crash keeps finished work
+
+    Records go to path + '.tmp', which close() renames over `path`, so the previous
+    complete output survives until the new one is finished.
+    """
+
+    def __init__(self, path: str, flush_every: int = 10):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.f = io.BufferedWriter(io.FileIO(self.tmp_path, 'w'), buffer_size=1 << 20)
+        self.f.write(b'[')
+        self.count = 0
+        self.flush_every = flush_every
+
+    def write(self, record: dict):
+        self.f.write(b',\n' if self.count else b'\n')
+        self.f.write(orjson.dumps(record, option=orjson.OPT_INDENT_2))
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.f.flush()
+
+    def close(self):
+        self.f.write(b'\n]\n')
+        self.f.close()
+        os.replace(self.tmp_path, self.path)
+
+class AdverseEvents(msgspec.Struct):
+    """adverse_events object of the extraction schemas"""
+    any_adverse_events: Optional[str] = None
+    grade_3_4_events: Optional[str] = None
+    serious_adverse_events: Union[str, int, float, None] = None
+    # The model sometimes answers with a bare string or a "null" / null entry instead of a list
+    most_common_events: Union[List[Optional[str]], str, None] = None
+    treatment_discontinuation: Union[str, int, float, None] = None
+    treatment_related_deaths: Union[str, int, float, None] = None
+
+# Papers per multi-paper prompt; batches that come back malformed are retried one by one
+BATCH_SIZE = 5
+
+BATCH_INSTRUCTION = """
+Extract data for EACH of the papers below, separated by ---. Return a JSON array with exactly one object per paper, each in the format above and carrying that paper's PMID in its "pmid" field.
+"""
+
+DYNAMIC_SUFFIX = """
+Paper Information:
+- PMID: {pmid}
+- Title: {title}
+- Abstract: {abstract}
+- Citation: {citation}
+"""
+
+# Times an invalid response is re-prompted with its validation error
+MAX_VALIDATION_RETRIES = 2
+
+# Body of the first ``` / ```json fenced block in a model response
+_FENCE = re.compile(r'```(?:json)?\s*(.*?)\s*```', re.DOTALL)
+
+def strip_fence(text: str) -> str:
+    """Return the fenced JSON body of a response, or the text itself if unfenced"""
+    m = _FENCE.search(text)
+    return m.group(1) if m else text
+
+def content_key(paper: dict) -> str:
+    """Hash of the text the extraction depends on, shared by duplicate PubMed entries"""
+    text = paper.get('title', '') + '\0' + paper.get('abstract', '')
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def with_paper_fields(record: dict, paper: dict) -> dict:
+    """Copy of a shared extraction carrying this paper's own identifiers"""
+    return dict(record,
+                pmid=paper['pmid'],
+                citation=paper.get('citation', ''),
+                title=paper.get('title', ''),
+                abstract=paper.get('abstract', ''))
+
+def match_by_pmid(papers: list, batch: list, records: list):
+    """Pair each batch entry with the record carrying its PMID, or None on any mismatch"""
+    # Position means nothing: the model may reorder, drop or repeat papers, so every
+    # PMID of the batch must come back exactly once and no other PMID may appear
+    by_pmid = {}
+    for record in records:
+        pmid = str(record.pmid).strip() if record.pmid is not None else None
+        if pmid is None or pmid in by_pmid:
+            return None
+        by_pmid[pmid] = record
+    wanted = [str(papers[indices[0]]['pmid']) for indices in batch]
+    if sorted(wanted) != sorted(by_pmid):
+        return None
+    return [(indices, msgspec.to_builtins(by_pmid[pmid])) for indices, pmid in zip(batch, wanted)]
+
+def paper_prompt(paper: dict) -> str:
+    """Paper-specific suffix of a prompt"""
+    return DYNAMIC_SUFFIX.format_map({"pmid": paper['pmid'], "title": paper.get('title', ''),
+                                      "abstract": paper.get('abstract', ''), "citation": paper.get('citation', '')})
+
+def is_transient(e: BaseException) -> bool:
+    """Rate limiting, server errors and dropped connections are worth retrying"""
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status == 429 or e.status >= 500
+    return isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+class GeminiExtractor:
+    """Extract one msgspec `schema` record per paper with the prompt `static_prefix`.
+
+    `data_flag` names the schema's has-data field, set to False on error records;
+    subclasses override report() to print what an extraction found.
+    """
+
+    def __init__(self, api_key: str, static_prefix: str, schema: type, data_flag: str,
+                 rate: int = 30, period: float = 60):
+        self.api_key = api_key
+        self.static_prefix = static_prefix
+        self.schema = schema
+        self.data_flag = data_flag
+        self.rate_limiter = AsyncRateLimiter(rate, period)
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT)  # requests in flight
+
+    def report(self, record: dict):
+        """Print a one-line summary of a validated extraction"""
+        print(f"   ✓ {self.data_flag}: {record.get(self.data_flag)}")
+
+    @retry(retry=retry_if_exception(is_transient),
+           wait=wait_random_exponential(multiplier=1, max=30),
+           stop=stop_after_attempt(5),
+           reraise=True)
+    async def call_api(self, session: aiohttp.ClientSession, prompt: str) -> str:
+        """POST one prompt to the Gemini REST endpoint and return the response text"""
+        await self.rate_limiter.acquire()
+        async with self.semaphore:
+            async with session.post(GEMINI_URL,
+                                    json={"contents": [{"parts": [{"text": prompt}]}]},
+                                    headers={"x-goog-api-key": self.api_key}) as r:
+                r.raise_for_status()
+                data = await r.json()
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+
+    def error_record(self, paper: dict, notes: str) -> dict:
+        """Placeholder record for a paper whose extraction failed"""
+        return with_paper_fields({
+            self.data_flag: False,
+            "adverse_events": {},
+            "extraction_notes": notes
+        }, paper)
+
+    async def extract_paper(self, session: aiohttp.ClientSession, i: int, paper: dict) -> dict:
+        """Run the Gemini extraction for one paper and return its record"""
+        title = paper.get('title', '')
+        print(f"\n{i+1}. Processing PMID {paper['pmid']}: {title[:60] if title else 'No title'}...")
+
+        prompt = self.static_prefix + paper_prompt(paper)
+        cached = llm_cache.get(prompt)
+        response_text = ''
+        try:
+            # Invalid output is re-prompted with its validation error before giving up
+            attempt_prompt = prompt
+            for attempt in range(MAX_VALIDATION_RETRIES + 1):
+                if attempt == 0 and cached is not None:
+                    response_text = cached
+                    print(f"   ↺ Using cached response")
+                else:
+                    response_text = (await self.call_api(session, attempt_prompt)).strip()
+                try:
+                    extracted = msgspec.json.decode(strip_fence(response_text), type=self.schema)
+                    break
+                except (msgspec.ValidationError, msgspec.DecodeError) as e:
+                    if attempt == MAX_VALIDATION_RETRIES:
+                        raise
+                    print(f"   ↻ Invalid output ({e}), retrying with feedback")
+                    attempt_prompt = (prompt + f"\n\nYour previous output failed validation: {e}. "
+                                      "Return only valid JSON conforming to the schema.")
+                    await asyncio.sleep(1.0 * (attempt + 1))
+
+            # Only cache responses that validated, so bad ones are retried next run
+            if attempt or cached is None:
+                llm_cache.set(prompt, response_text)
+
+            record = msgspec.to_builtins(extracted)
+            if attempt:
+                record['extraction_notes'] = f"{record['extraction_notes'] or ''} [retries: {attempt}]".lstrip()
+            self.report(record)
+            return record
+
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            print(f"   ✗ Invalid output after {MAX_VALIDATION_RETRIES} retries: {e}")
+            print(f"   Response: {response_text[:200]}...")
+            return self.error_record(paper, f"Validation error after {MAX_VALIDATION_RETRIES} retries: {e}")
+
+        except Exception as e:
+            print(f"   ✗ API error: {e}")
+            return self.error_record(paper, f"API error: {e}")
+
+    async def extract_batch(self, session: aiohttp.ClientSession, papers: list, batch: list) -> list:
+        """Extract the first paper of each duplicate group in `batch` with one prompt.
+
+        Returns (indices, record) pairs. If the batch call fails or the response does
+        not hold exactly one object per paper's PMID, each paper is re-extracted on its own.
+        """
+        if len(batch) > 1:
+            prompt = self.static_prefix + BATCH_INSTRUCTION + "\n---\n".join(
+                paper_prompt(papers[indices[0]]) for indices in batch)
+            cached = llm_cache.get(prompt)
+            try:
+                if cached is not None:
+                    response_text = cached
+                else:
+                    response_text = (await self.call_api(session, prompt)).strip()
+                records = msgspec.json.decode(strip_fence(response_text), type=List[self.schema])
+                matched = match_by_pmid(papers, batch, records)
+                if matched is not None:
+                    if cached is None:
+                        llm_cache.set(prompt, response_text)
+                    print(f"\n✓ Batch of {len(batch)} papers from #{batch[0][0]+1} extracted in one call")
+                    return matched
+                print(f"\n✗ Batch from #{batch[0][0]+1} returned PMIDs that do not match its {len(batch)} papers, retrying per paper")
+            except Exception as e:
+                print(f"\n✗ Batch from #{batch[0][0]+1} failed ({e}), retrying per paper")
+
+        records = await asyncio.gather(*(self.extract_paper(session, indices[0], papers[indices[0]]) for indices in batch))
+        return list(zip(batch, records))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of Gemini responses keyed by SHA-256 of the prompt
+Reruns over the same papers skip both the API call and the rate-limit sleep
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+
+CACHE_DIR = 'llm_cache'
+
+# Bump when prompts change in a way that should invalidate earlier responses
+PROMPT_VERSION = "v1"
+
+def _cache_path(prompt: str) -> str:
+    digest = hashlib.sha256((PROMPT_VERSION + "\n" + prompt).encode()).hexdigest()
+    return os.path.join(CACHE_DIR, digest + '.json')
+
+def get(prompt: str) -> Optional[str]:
+    """Return the cached response text for `prompt`, or None on a miss"""
+    try:
+        with open(_cache_path(prompt), 'r') as f:
+            return json.load(f)['text']
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+def set(prompt: str, text: str):
+    """Store the response text for `prompt`"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # A unique temp file per writer, since concurrent extractions can store the same prompt;
+    # the atomic rename means an interrupted run never leaves a half-written entry
+    with tempfile.NamedTemporaryFile('w', dir=CACHE_DIR, suffix='.tmp', delete=False) as f:
+        json.dump({'text': text}, f)
+    try:
+        os.replace(f.name, _cache_path(prompt))
+    except OSError:
+        os.unlink(f.name)
+        raise
@@ -1,20 +1,57 @@
-import requests
+import asyncio
+import aiohttp
 import json
+import orjson
 import pandas as pd
 from typing import Dict, List, Optional
 import time
 from dataclasses import dataclass
 from bs4 import BeautifulSoup
+import soupsieve as sv
 import google.generativeai as genai
 import os
 import re
 from urllib.parse import urljoin, quote
 import xml.etree.ElementTree as ET
+from lxml import etree
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pubmed_cache
+from eutils_session import NCBI_API_KEY, NCBI_RATE, new_session
 
 # Configure Gemini API
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
+# Keyword relevance filter: one case-insensitive scan instead of lowercasing and substring checks;
+# the word boundary keeps "CMML" from matching inside longer tokens
+_CMML_RE = re.compile(r'\bcmml\b|chronic myelomonocytic leukemia', re.IGNORECASE)
+
+# PMID and title locations across PubMed's search page layouts, compiled once and tried in
+# priority order (a comma-joined selector would return whichever match comes first in the page,
+# e.g. the title link, which also carries data-article-id)
+_PMID_SELECTORS = [sv.compile(selector) for selector in ('strong.current-id', '.docsum-pmid', '[data-article-id]')]
+_TITLE_SELECTORS = [sv.compile(selector) for selector in ('a.docsum-title', '.docsum-title a', 'h3 a')]
+
+# Comparative table column -> key in the ras_mutant_data / non_ras_mutant_data dicts
+_SUBTYPE_COLUMNS = {
+    'Complete Response (%)': 'cr_rate',
+    'Partial Response (%)': 'pr_rate',
+    'Marrow CR (%)': 'mcr_rate',
+    'Marrow Optimal (%)': 'mor_rate',
+    'PFS (months)': 'pfs_median',
+    'OS (months)': 'os_median',
+    'EFS (months)': 'efs_median',
+    'SAEs (%)': 'sae_rate'
+}
+
+# Drugs processed by main(), in table order, with the extra term used in their CMML query
+DRUG_TERMS = {
+    "azacitidine": "hypomethylating",
+    "decitabine": "hypomethylating",
+    "hydroxyurea": "cytoreductive"
+}
+
 @dataclass
 class ClinicalOutcome:
     """Structure for CMML clinical outcome data with detailed efficacy measures"""
@@ -54,10 +91,55 @@ class PubMedScraper:
     def __init__(self):
         self.base_url = "https://pubmed.ncbi.nlm.nih.gov"
         self.eutils_base = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        # Sent by both the requests session and the aiohttp sessions used for the query fan-out
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            # efetch XML compresses well; the streamed response is decoded as it is parsed
+            'Accept-Encoding': 'gzip, deflate'
+        }
+        # Pooled, retrying E-utilities session; its own copy since the browser headers replace the defaults
+        self.session = new_session()
+        self.session.headers.update(self.headers)
+        self.api_key = NCBI_API_KEY
+        self.rate = NCBI_RATE
+        # Shared by threads and coroutines so concurrent E-utilities calls stay within self.rate
+        self._rate_lock = threading.Lock()
+        self._next_request = 0.0
+        # Parsed efetch records by PMID; the drugs' result sets overlap heavily
+        self._paper_cache: Dict[str, Dict] = {}
+
+    def _reserve_slot(self) -> float:
+        """Claim the next E-utilities request slot and return how long to wait for it"""
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + 1 / self.rate
+        return wait
+
+    def _throttle(self):
+        """Block until the next E-utilities request fits within NCBI's rate limit"""
+        wait = self._reserve_slot()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def _throttle_async(self):
+        """Like _throttle, but yields to the event loop while waiting"""
+        wait = self._reserve_slot()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _eutils_params(self, params: Dict) -> Dict:
+        """Add the API key to E-utilities request parameters when one is configured"""
+        if self.api_key:
+            params['api_key'] = self.api_key
+        return params
+
+    async def gather_queries(self, search, queries: List[str], max_results: int) -> List:
+        """Run search(session, query, max_results) for every query concurrently on one aiohttp session"""
+        connector = aiohttp.TCPConnector(limit_per_host=self.rate)
+        timeout = aiohttp.ClientTimeout(total=60)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers) as session:
+            return await asyncio.gather(*[search(session, query, max_results) for query in queries])
 
     def fetch_pmc_fulltext(self, pmcid: str) -> Optional[str]:
         """Try to fetch full text from PMC via E-utilities (XML) and fallback to HTML scraping."""
@@ -68,21 +150,23 @@ class PubMedScraper:
         try:
             # Try efetch for PMC NXML
             fetch_url = f"{self.eutils_base}/efetch.fcgi"
-            params = {
+            params = self._eutils_params({
                 'db': 'pmc',
                 'id': pmc_id_value,
                 'retmode': 'xml'
-            }
-            response = self.session.get(fetch_url, params=params)
-            response.raise_for_status()
-            try:
-                root = ET.fromstring(response.content)
-                body = root.find('.//body')
-                if body is not None:
-                    text = ''.join(body.itertext())
-                    return re.sub(r'\s+', ' ', text).strip()[:200000]  # cap to 200k chars
-            except ET.ParseError:
-                pass
+            })
+            self._throttle()
+            with self.session.get(fetch_url, params=params, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                try:
+                    # Only <body> is needed, so stream the article and stop as soon as it closes
+                    for _, elem in ET.iterparse(response.raw, events=('end',)):
+                        if elem.tag == 'body':
+                            text = ''.join(elem.itertext())
+                            return re.sub(r'\s+', ' ', text).strip()[:200000]  # cap to 200k chars
+                except ET.ParseError:
+                    pass
         except Exception:
             pass
         # Fallback to HTML scraping
@@ -90,30 +174,31 @@ class PubMedScraper:
             url = f"https://www.ncbi.nlm.nih.gov/pmc/articles/PMC{pmc_id_value}/"
             resp = self.session.get(url)
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.content, 'html.parser')
+            soup = BeautifulSoup(resp.content, 'lxml')
             article = soup.select_one('div#maincontent') or soup
             text = article.get_text(separator=' ', strip=True)
             return re.sub(r'\s+', ' ', text).strip()[:200000]
         except Exception:
             return None
 
-    def search_with_eutils(self, query: str, max_results: int = 20) -> List[str]:
+    async def search_with_eutils(self, session: aiohttp.ClientSession, query: str, max_results: int = 20) -> List[str]:
         """Use E-utilities API to search for PMIDs (no API key required for basic searches)"""
         try:
             search_url = f"{self.eutils_base}/esearch.fcgi"
-            params = {
+            params = self._eutils_params({
                 'db': 'pubmed',
                 'term': query,
                 'retmax': max_results,
                 'retmode': 'json',
                 'sort': 'relevance'
-            }
+            })
             
             print(f"Searching E-utilities: {query}")
-            response = self.session.get(search_url, params=params)
-            response.raise_for_status()
+            await self._throttle_async()
+            async with session.get(search_url, params=params) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
             
-            data = response.json()
             pmids = data.get('esearchresult', {}).get('idlist', [])
             print(f"Found {len(pmids)} PMIDs")
             return pmids
@@ -122,177 +207,200 @@ class PubMedScraper:
             print(f"E-utilities search failed: {e}")
             return []
 
+    def _parse_article(self, article: etree._Element) -> Optional[Dict]:
+        """Build the paper dict for one <PubmedArticle>, or None if it has no abstract"""
+        # One walk over the article collects every element the fields below need
+        pmid_elem = title_elem = journal_elem = year_elem = pmcid_elem = None
+        abstract_elems = []
+        author_elems = []
+        for elem in article.iter():
+            tag = elem.tag
+            if tag == 'AbstractText':
+                abstract_elems.append(elem)
+            elif tag == 'Author':
+                author_elems.append(elem)
+            elif tag == 'PMID':
+                if pmid_elem is None:
+                    pmid_elem = elem
+            elif tag == 'ArticleTitle':
+                if title_elem is None:
+                    title_elem = elem
+            elif tag == 'Journal':
+                if journal_elem is None:
+                    journal_elem = elem.find('Title')
+            elif tag == 'PubDate':
+                if year_elem is None:
+                    year_elem = elem.find('Year')
+            elif tag == 'ArticleId':
+                if pmcid_elem is None and elem.get('IdType') == 'pmc':
+                    pmcid_elem = elem
+        pmid = pmid_elem.text if pmid_elem is not None else None
+        title = title_elem.text if title_elem is not None else "No title"
+        # Abstract
+        abstract_parts = []
+        for abstract_elem in abstract_elems:
+            label = abstract_elem.get('Label', '')
+            text = abstract_elem.text or ''
+            if label:
+                abstract_parts.append(f"{label}: {text}")
+            else:
+                abstract_parts.append(text)
+        abstract = " ".join(abstract_parts)
+        # Authors
+        authors = []
+        for author in author_elems:
+            last_name = author.find('LastName')
+            first_name = author.find('ForeName')
+            if last_name is not None:
+                author_name = last_name.text
+                if first_name is not None:
+                    author_name += f" {first_name.text}"
+                authors.append(author_name)
+        author_str = ", ".join(authors[:3])
+        if len(authors) > 3:
+            author_str += " et al."
+        # Journal/year
+        journal = journal_elem.text if journal_elem is not None else "Unknown journal"
+        year = year_elem.text if year_elem is not None else "Unknown year"
+        # PMCID for potential full text
+        pmcid = pmcid_elem.text if pmcid_elem is not None else None
+        if not (pmid and title and abstract):
+            return None
+        return {
+            'pmid': pmid,
+            'title': title,
+            'abstract': abstract,
+            'authors': author_str,
+            'journal_info': f"{journal} ({year})",
+            'year': year,
+            'url': f"{self.base_url}/{pmid}/",
+            'pmcid': pmcid,
+            'full_content': f"Title: {title}\n\nAuthors: {author_str}\n\nJournal: {journal} ({year})\n\nAbstract: {abstract}"
+        }
+
     def get_paper_details_eutils(self, pmids: List[str]) -> List[Dict]:
         """Get paper details using E-utilities (batched efetch across all PMIDs)."""
-        if not pmids:
-            return []
+        # Only PMIDs not already fetched by an earlier call or an earlier run go to efetch
+        missing = []
+        for pmid in pmids:
+            if pmid in self._paper_cache:
+                continue
+            xml = pubmed_cache.get(pmid)
+            if xml is None:
+                missing.append(pmid)
+                continue
+            paper = self._parse_article(etree.fromstring(xml))
+            if paper:
+                self._paper_cache[pmid] = paper
         try:
             fetch_url = f"{self.eutils_base}/efetch.fcgi"
-            papers: List[Dict] = []
-            # Batch efetch to avoid query length limits; PubMed supports large batches but be conservative
-            batch_size = 100
-            for i in range(0, len(pmids), batch_size):
-                batch_ids = pmids[i:i+batch_size]
-                params = {
+            # 200 ids per efetch, the batch size NCBI documents for id lists
+            batch_size = 200
+            for i in range(0, len(missing), batch_size):
+                batch_ids = missing[i:i+batch_size]
+                data = self._eutils_params({
                     'db': 'pubmed',
                     'id': ','.join(batch_ids),
                     'retmode': 'xml'
-                }
-                response = self.session.get(fetch_url, params=params)
-                response.raise_for_status()
-                root = ET.fromstring(response.content)
-                for article in root.findall('.//PubmedArticle'):
-                    try:
-                        pmid_elem = article.find('.//PMID')
-                        pmid = pmid_elem.text if pmid_elem is not None else None
-                        title_elem = article.find('.//ArticleTitle')
-                        title = title_elem.text if title_elem is not None else "No title"
-                        # Abstract
-                        abstract_parts = []
-                        for abstract_elem in article.findall('.//AbstractText'):
-                            label = abstract_elem.get('Label', '')
-                            text = abstract_elem.text or ''
-                            if label:
-                                abstract_parts.append(f"{label}: {text}")
-                            else:
-                                abstract_parts.append(text)
-                        abstract = " ".join(abstract_parts)
-                        # Authors
-                        authors = []
-                        for author in article.findall('.//Author'):
-                            last_name = author.find('.//LastName')
-                            first_name = author.find('.//ForeName')
-                            if last_name is not None:
-                                author_name = last_name.text
-                                if first_name is not None:
-                                    author_name += f" {first_name.text}"
-                                authors.append(author_name)
-                        author_str = ", ".join(authors[:3])
-                        if len(authors) > 3:
-                            author_str += " et al."
-                        # Journal/year
-                        journal_elem = article.find('.//Journal/Title')
-                        journal = journal_elem.text if journal_elem is not None else "Unknown journal"
-                        year_elem = article.find('.//PubDate/Year')
-                        year = year_elem.text if year_elem is not None else "Unknown year"
-                        # Try to get PMCID for potential full text
-                        pmcid_elem = article.find(".//ArticleIdList/ArticleId[@IdType='pmc']")
-                        pmcid = pmcid_elem.text if pmcid_elem is not None else None
-                        if pmid and title and abstract:
-                            papers.append({
-                                'pmid': pmid,
-                                'title': title,
-                                'abstract': abstract,
-                                'authors': author_str,
-                                'journal_info': f"{journal} ({year})",
-                                'year': year,
-                                'url': f"{self.base_url}/{pmid}/",
-                                'pmcid': pmcid,
-                                'full_content': f"Title: {title}\n\nAuthors: {author_str}\n\nJournal: {journal} ({year})\n\nAbstract: {abstract}"
-                            })
-                    except Exception as e:
-                        print(f"Error parsing article: {e}")
-                        continue
-                time.sleep(0.34)  # ~3 req/sec respectful pacing
-            return papers
+                })
+                self._throttle()
+                # POST so long id lists don't hit URL length limits
+                with self.session.post(fetch_url, data=data, stream=True) as response:
+                    response.raise_for_status()
+                    # Parse the XML with libxml2 as it downloads instead of holding the whole response and tree
+                    response.raw.decode_content = True
+                    for _, elem in etree.iterparse(response.raw, events=('end',), tag='PubmedArticle'):
+                        try:
+                            # Cache the raw article, abstract or not, so reruns skip the fetch
+                            pubmed_cache.set(elem.findtext('.//PMID'), etree.tostring(elem, with_tail=False))
+                            paper = self._parse_article(elem)
+                            if paper:
+                                self._paper_cache[paper['pmid']] = paper
+                        except Exception as e:
+                            print(f"Error parsing article: {e}")
+                        # Free the finished article's subtree and drop it from the root
+                        elem.clear()
+                        while elem.getprevious() is not None:
+                            del elem.getparent()[0]
         except Exception as e:
             print(f"Error fetching paper details: {e}")
+        return [self._paper_cache[pmid] for pmid in pmids if pmid in self._paper_cache]
+
+    def _parse_fallback_html(self, content: bytes, max_results: int) -> List[Dict]:
+        """Extract the papers from a PubMed search results page"""
+        soup = BeautifulSoup(content, 'lxml')
+
+        # Try multiple possible selectors for articles
+        article_selectors = [
+            'article.full-docsum',
+            'div.docsum-wrap',
+            'div.rprt',
+            '[data-ga-action="result_click"]'
+        ]
+
+        articles = []
+        for selector in article_selectors:
+            articles = soup.select(selector)
+            if articles:
+                print(f"Found articles using selector: {selector}")
+                break
+
+        if not articles:
+            print("No articles found with any selector")
             return []
 
-    def search_pubmed_advanced(self, query: str, max_results: int = 20) -> List[Dict]:
-        """Enhanced search method using multiple approaches"""
-        print(f"Searching for: {query}")
-        
-        # Try E-utilities first
-        pmids = self.search_with_eutils(query, max_results)
-        if pmids:
-            papers = self.get_paper_details_eutils(pmids)
-            if papers:
-                return papers
-        
-        # Fallback to web scraping with updated selectors
-        return self.search_pubmed_web_fallback(query, max_results)
+        papers = []
+        for article in articles[:max_results]:
+            try:
+                # Try multiple methods to extract PMID
+                pmid = None
+                for selector in _PMID_SELECTORS:
+                    pmid_elem = selector.select_one(article)
+                    if pmid_elem:
+                        pmid = pmid_elem.get_text(strip=True) or pmid_elem.get('data-article-id')
+                        if pmid:
+                            break
+
+                # Try multiple methods to extract title
+                title = None
+                for selector in _TITLE_SELECTORS:
+                    title_elem = selector.select_one(article)
+                    if title_elem:
+                        title = title_elem.get_text(strip=True)
+                        if title:
+                            break
 
-    def search_pubmed_web_fallback(self, query: str, max_results: int = 20) -> List[Dict]:
+                if pmid and title:
+                    papers.append({
+                        'pmid': pmid,
+                        'title': title,
+                        'authors': 'Unknown authors',
+                        'journal_info': 'Unknown journal',
+                        'snippet': '',
+                        'url': f"{self.base_url}/{pmid}/"
+                    })
+
+            except Exception as e:
+                print(f"Error parsing article: {e}")
+                continue
+
+        print(f"Found {len(papers)} papers via web scraping")
+        return papers
+
+    async def search_pubmed_web_fallback(self, session: aiohttp.ClientSession, query: str, max_results: int = 20) -> List[Dict]:
         """Fallback web scraping method with updated CSS selectors"""
         try:
             encoded_query = quote(query)
             search_url = f"{self.base_url}/?term={encoded_query}&size={max_results}"
             
             print(f"Trying web scraping: {search_url}")
-            response = self.session.get(search_url)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Try multiple possible selectors for articles
-            article_selectors = [
-                'article.full-docsum',
-                'div.docsum-wrap',
-                'div.rprt',
-                '[data-ga-action="result_click"]'
-            ]
-            
-            articles = []
-            for selector in article_selectors:
-                articles = soup.select(selector)
-                if articles:
-                    print(f"Found articles using selector: {selector}")
-                    break
-            
-            if not articles:
-                print("No articles found with any selector")
-                return []
-            
-            papers = []
-            for article in articles[:max_results]:
-                try:
-                    # Try multiple methods to extract PMID
-                    pmid = None
-                    pmid_selectors = [
-                        'strong.current-id',
-                        '.docsum-pmid',
-                        '[data-article-id]'
-                    ]
-                    
-                    for selector in pmid_selectors:
-                        pmid_elem = article.select_one(selector)
-                        if pmid_elem:
-                            pmid = pmid_elem.get_text(strip=True) or pmid_elem.get('data-article-id')
-                            if pmid:
-                                break
-                    
-                    # Try multiple methods to extract title
-                    title = None
-                    title_selectors = [
-                        'a.docsum-title',
-                        '.docsum-title a',
-                        'h3 a'
-                    ]
-                    
-                    for selector in title_selectors:
-                        title_elem = article.select_one(selector)
-                        if title_elem:
-                            title = title_elem.get_text(strip=True)
-                            if title:
-                                break
-                    
-                    if pmid and title:
-                        papers.append({
-                            'pmid': pmid,
-                            'title': title,
-                            'authors': 'Unknown authors',
-                            'journal_info': 'Unknown journal',
-                            'snippet': '',
-                            'url': f"{self.base_url}/{pmid}/"
-                        })
-                        
-                except Exception as e:
-                    print(f"Error parsing article: {e}")
-                    continue
+            await self._throttle_async()
+            async with session.get(search_url) as response:
+                response.raise_for_status()
+                content = await response.read()
             
-            print(f"Found {len(papers)} papers via web scraping")
-            return papers
+            # BeautifulSoup is CPU-bound; parse on a worker thread so the other queries keep going
+            return await asyncio.to_thread(self._parse_fallback_html, content, max_results)
             
         except Exception as e:
             print(f"Web scraping fallback failed: {e}")
@@ -551,19 +659,31 @@ class CMMLResearchExtractor:
         if additional_terms:
             queries.append(f"CMML {additional_terms} {drug_name}")
         
-        all_papers = []
+        # Pool the PMIDs of every query first so each paper is fetched once, in one batched efetch
+        pmids = []
         seen_pmids = set()
         
-        for query in queries:
-            papers = self.scraper.search_pubmed_advanced(query, max_results=max_results)
-            
-            # Deduplicate by PMID
-            for paper in papers:
-                if paper['pmid'] not in seen_pmids:
-                    all_papers.append(paper)
-                    seen_pmids.add(paper['pmid'])
-            
-            time.sleep(2)  # Rate limiting
+        # The searches are network-bound, so issue them concurrently; the scraper's throttle keeps
+        # them within NCBI's rate limit
+        query_results = asyncio.run(self.scraper.gather_queries(self.scraper.search_with_eutils, queries, max_results))
+        
+        for query_pmids in query_results:
+            for pmid in query_pmids:
+                if pmid not in seen_pmids:
+                    pmids.append(pmid)
+                    seen_pmids.add(pmid)
+        
+        all_papers = self.scraper.get_paper_details_eutils(pmids)
+        
+        # Fallback to web scraping when E-utilities returned nothing usable
+        if not all_papers:
+            seen_pmids = set()
+            fallback_results = asyncio.run(self.scraper.gather_queries(self.scraper.search_pubmed_web_fallback, queries, max_results))
+            for query_papers in fallback_results:
+                for paper in query_papers:
+                    if paper['pmid'] not in seen_pmids:
+                        all_papers.append(paper)
+                        seen_pmids.add(paper['pmid'])
         
         print(f"Total unique papers found: {len(all_papers)}")
         
@@ -576,19 +696,25 @@ class CMMLResearchExtractor:
         
         clinical_outcomes = []
         
-        for i, paper in enumerate(all_papers[:min(len(all_papers), max_results)]):
-            print(f"Processing paper {i+1}/{min(len(all_papers), 15)}: {paper['title'][:60]}...")
+        papers_to_process = all_papers[:max_results]
+        
+        # Relevance check: if LLM enabled, let AI decide; else use the keyword filter
+        def is_relevant(paper: Dict) -> bool:
+            return self.use_llm or any(_CMML_RE.search(text) for text in (paper['title'], paper.get('abstract', ''), paper.get('snippet', '')))
+        
+        # Web-scraped papers carry no abstract; fetch all the relevant ones in a single efetch
+        need_fetch = [paper['pmid'] for paper in papers_to_process if not paper.get('abstract') and is_relevant(paper)]
+        details_by_pmid = {details['pmid']: details for details in self.scraper.get_paper_details_eutils(need_fetch)}
+        
+        for i, paper in enumerate(papers_to_process):
+            print(f"Processing paper {i+1}/{len(papers_to_process)}: {paper['title'][:60]}...")
             
-            # Relevance check: if LLM enabled, let AI decide; else use keyword filter
-            keyword_relevant = ('cmml' in f"{paper['title']} {paper.get('abstract', '')} {paper.get('snippet', '')}".lower() or 
-                                 'chronic myelomonocytic leukemia' in f"{paper['title']} {paper.get('abstract', '')} {paper.get('snippet', '')}".lower())
+            if not is_relevant(paper):
+                print("  Skipping - not CMML relevant (keyword filter)")
+                continue
             
-            # If we have abstract from E-utilities, use it directly; otherwise fetch
-            if paper.get('abstract'):
-                paper_data = paper
-            else:
-                full_paper = self.scraper.get_paper_details_eutils([paper['pmid']])
-                paper_data = full_paper[0] if full_paper else paper
+            # If we have abstract from E-utilities, use it directly; otherwise use the batched fetch
+            paper_data = paper if paper.get('abstract') else details_by_pmid.get(paper['pmid'], paper)
             
             if not paper_data.get('abstract') and not paper_data.get('snippet'):
                 print(f"  Skipping - no abstract available")
@@ -600,10 +726,6 @@ class CMMLResearchExtractor:
                 pmc_text = self.scraper.fetch_pmc_fulltext(paper_data['pmcid'])
                 if pmc_text:
                     content = f"Title: {paper_data['title']}\n\nFullText: {pmc_text}"
-            # If LLM disabled, require keyword relevance; if enabled, rely on model
-            if not self.use_llm and not keyword_relevant:
-                print("  Skipping - not CMML relevant (keyword filter)")
-                continue
             extracted_data = self.extract_clinical_data(content)
             
             if not extracted_data:
@@ -695,69 +817,26 @@ class CMMLResearchExtractor:
                 'Sample Size': f"{total_sample}" if total_sample else '...'
             }
         
+        def subtype_row(subtype: str, data: Optional[Dict], sample: Optional[int]):
+            """Build one mutation subtype row, with '...' for anything not reported"""
+            data = data or {}
+            row = {'Drug': '', 'CMML Subtype': subtype}
+            for column, key in _SUBTYPE_COLUMNS.items():
+                value = data.get(key)
+                row[column] = f"{value:.1f}" if value else '...'
+            row['Sample Size'] = f"{sample}" if sample else '...'
+            return row
+        
         def add_mutation_rows(outcomes: List[ClinicalOutcome], drug_name: str):
             """Add RAS mutation-specific rows if data is available"""
-            rows = []
-            
-            # Check if any outcome has RAS mutation data
-            has_ras_data = any(o.ras_mutant_data for o in outcomes if o.ras_mutant_data)
-            has_non_ras_data = any(o.non_ras_mutant_data for o in outcomes if o.non_ras_mutant_data)
+            # The first outcome reporting each subtype supplies its row
+            ras = next((o for o in outcomes if o.ras_mutant_data), None)
+            non_ras = next((o for o in outcomes if o.non_ras_mutant_data), None)
             
-            if has_ras_data:
-                ras_outcomes = [o for o in outcomes if o.ras_mutant_data]
-                ras_data = ras_outcomes[0].ras_mutant_data
-                ras_sample = ras_outcomes[0].ras_mutant_sample_size
-                
-                rows.append({
-                    'Drug': '',
-                    'CMML Subtype': 'RAS-mutant',
-                    'Complete Response (%)': f"{ras_data.get('cr_rate', 0):.1f}" if ras_data.get('cr_rate') else '...',
-                    'Partial Response (%)': f"{ras_data.get('pr_rate', 0):.1f}" if ras_data.get('pr_rate') else '...',
-                    'Marrow CR (%)': f"{ras_data.get('mcr_rate', 0):.1f}" if ras_data.get('mcr_rate') else '...',
-                    'Marrow Optimal (%)': f"{ras_data.get('mor_rate', 0):.1f}" if ras_data.get('mor_rate') else '...',
-                    'PFS (months)': f"{ras_data.get('pfs_median', 0):.1f}" if ras_data.get('pfs_median') else '...',
-                    'OS (months)': f"{ras_data.get('os_median', 0):.1f}" if ras_data.get('os_median') else '...',
-                    'EFS (months)': f"{ras_data.get('efs_median', 0):.1f}" if ras_data.get('efs_median') else '...',
-                    'SAEs (%)': f"{ras_data.get('sae_rate', 0):.1f}" if ras_data.get('sae_rate') else '...',
-                    'Sample Size': f"{ras_sample}" if ras_sample else '...'
-                })
-            else:
-                rows.append({
-                    'Drug': '', 'CMML Subtype': 'RAS-mutant',
-                    'Complete Response (%)': '...', 'Partial Response (%)': '...',
-                    'Marrow CR (%)': '...', 'Marrow Optimal (%)': '...',
-                    'PFS (months)': '...', 'OS (months)': '...',
-                    'EFS (months)': '...', 'SAEs (%)': '...', 'Sample Size': '...'
-                })
-            
-            if has_non_ras_data:
-                non_ras_outcomes = [o for o in outcomes if o.non_ras_mutant_data]
-                non_ras_data = non_ras_outcomes[0].non_ras_mutant_data
-                non_ras_sample = non_ras_outcomes[0].non_ras_mutant_sample_size
-                
-                rows.append({
-                    'Drug': '',
-                    'CMML Subtype': 'Non-RAS-mutant',
-                    'Complete Response (%)': f"{non_ras_data.get('cr_rate', 0):.1f}" if non_ras_data.get('cr_rate') else '...',
-                    'Partial Response (%)': f"{non_ras_data.get('pr_rate', 0):.1f}" if non_ras_data.get('pr_rate') else '...',
-                    'Marrow CR (%)': f"{non_ras_data.get('mcr_rate', 0):.1f}" if non_ras_data.get('mcr_rate') else '...',
-                    'Marrow Optimal (%)': f"{non_ras_data.get('mor_rate', 0):.1f}" if non_ras_data.get('mor_rate') else '...',
-                    'PFS (months)': f"{non_ras_data.get('pfs_median', 0):.1f}" if non_ras_data.get('pfs_median') else '...',
-                    'OS (months)': f"{non_ras_data.get('os_median', 0):.1f}" if non_ras_data.get('os_median') else '...',
-                    'EFS (months)': f"{non_ras_data.get('efs_median', 0):.1f}" if non_ras_data.get('efs_median') else '...',
-                    'SAEs (%)': f"{non_ras_data.get('sae_rate', 0):.1f}" if non_ras_data.get('sae_rate') else '...',
-                    'Sample Size': f"{non_ras_sample}" if non_ras_sample else '...'
-                })
-            else:
-                rows.append({
-                    'Drug': '', 'CMML Subtype': 'Non-RAS-mutant', 
-                    'Complete Response (%)': '...', 'Partial Response (%)': '...',
-                    'Marrow CR (%)': '...', 'Marrow Optimal (%)': '...',
-                    'PFS (months)': '...', 'OS (months)': '...',
-                    'EFS (months)': '...', 'SAEs (%)': '...', 'Sample Size': '...'
-                })
-            
-            return rows
+            return [
+                subtype_row('RAS-mutant', ras and ras.ras_mutant_data, ras and ras.ras_mutant_sample_size),
+                subtype_row('Non-RAS-mutant', non_ras and non_ras.non_ras_mutant_data, non_ras and non_ras.non_ras_mutant_sample_size)
+            ]
         
         # Create rows for the table
         rows = []
@@ -788,29 +867,27 @@ class CMMLResearchExtractor:
         # Top 3 citations with more detail
         top_studies = []
         for outcome in outcomes[:3]:
-            study_detail = f"PMID:{outcome.pmid}"
-            if outcome.cmml_sample_size:
-                study_detail += f" (n={outcome.cmml_sample_size})"
-            if outcome.data_source_location:
-                study_detail += f" [{outcome.data_source_location}]"
-            top_studies.append(study_detail)
-        
-        summary = f"{drug_name}: "
+            sample = f" (n={outcome.cmml_sample_size})" if outcome.cmml_sample_size else ""
+            location = f" [{outcome.data_source_location}]" if outcome.data_source_location else ""
+            top_studies.append(f"PMID:{outcome.pmid}{sample}{location}")
+        
+        # Collect the sentences and join once rather than growing one string
+        parts = [f"{drug_name}: "]
         if response_rates:
-            summary += f"Shows clinical activity in CMML with complete response rates ranging from {min(response_rates):.1f}% to {max(response_rates):.1f}%. "
+            parts.append(f"Shows clinical activity in CMML with complete response rates ranging from {min(response_rates):.1f}% to {max(response_rates):.1f}%. ")
         if survival_data:
-            summary += f"Median overall survival reported as {min(survival_data):.1f}-{max(survival_data):.1f} months. "
+            parts.append(f"Median overall survival reported as {min(survival_data):.1f}-{max(survival_data):.1f} months. ")
         if safety_data:
-            summary += f"Safety profile shows {min(safety_data):.1f}-{max(safety_data):.1f}% serious adverse events. "
+            parts.append(f"Safety profile shows {min(safety_data):.1f}-{max(safety_data):.1f}% serious adverse events. ")
         
         if total_patients:
-            summary += f"Data from {len(outcomes)} CMML-specific studies (total n={total_patients} patients). "
+            parts.append(f"Data from {len(outcomes)} CMML-specific studies (total n={total_patients} patients). ")
         else:
-            summary += f"Based on {len(outcomes)} CMML-specific studies. "
+            parts.append(f"Based on {len(outcomes)} CMML-specific studies. ")
             
-        summary += f"Key studies: {', '.join(top_studies)}."
+        parts.append(f"Key studies: {', '.join(top_studies)}.")
         
-        return summary
+        return ''.join(parts)
 
 def test_gemini_api(api_key: str):
     """Test Gemini API with a simple request"""
@@ -836,10 +913,50 @@ def test_gemini_api(api_key: str):
         print(f"Gemini API test failed: {e}")
         return False
 
+def write_results_json(path: str, results: Dict):
+    """Write the detailed outcomes payload"""
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(results, default=str, option=orjson.OPT_INDENT_2))
+
+def write_attribution_summary(path: str, results: Dict):
+    """Write the human-readable per-drug attribution summary"""
+    with open(path, "w") as f:
+        f.write("CMML CLINICAL DATA - ATTRIBUTION SUMMARY\n")
+        f.write("=" * 50 + "\n\n")
+        outcome_fields = ClinicalOutcome().__dict__.keys()
+        for drug in DRUG_TERMS:
+            drug_name = drug.capitalize()
+            outcomes = [ClinicalOutcome(**{k: v for k, v in x.items() if k in outcome_fields}) for x in results.get(drug, [])]
+            f.write(f"{drug_name.upper()}\n")
+            f.write("-" * len(drug_name) + "\n")
+            for i, outcome in enumerate(outcomes, 1):
+                f.write(f"\n{i}. PMID {outcome.pmid}\n")
+                f.write(f"   Citation: {outcome.citation[:100]}...\n")
+                if outcome.key_findings:
+                    f.write(f"   Key Findings: {outcome.key_findings}\n")
+                if outcome.patient_population:
+                    f.write(f"   Patient Population: {outcome.patient_population}\n")
+                if outcome.treatment_details:
+                    f.write(f"   Treatment: {outcome.treatment_details}\n")
+                if outcome.data_source_location:
+                    f.write(f"   Data Location: {outcome.data_source_location}\n")
+                if outcome.complete_response is not None:
+                    f.write(f"   Complete Response: {outcome.complete_response}%\n")
+                if outcome.partial_response is not None:
+                    f.write(f"   Partial Response: {outcome.partial_response}%\n")
+                if outcome.os_median is not None:
+                    f.write(f"   Overall Survival: {outcome.os_median} months\n")
+                if outcome.supporting_quotes:
+                    f.write("   Supporting Quotes:\n")
+                    for quote in outcome.supporting_quotes[:2]:
+                        f.write(f"     - \"{str(quote)[:100]}...\"\n")
+                f.write(f"   URL: {outcome.url}\n")
+            f.write("\n" + "=" * 50 + "\n")
+
 def main():
     """Main execution function with CLI controls"""
     parser = argparse.ArgumentParser(description="CMML data extractor")
-    parser.add_argument("--drug", choices=["azacitidine", "decitabine", "hydroxyurea", "all"], default="all", help="Which drug to process")
+    parser.add_argument("--drug", choices=[*DRUG_TERMS, "all"], default="all", help="Which drug to process")
     parser.add_argument("--max", type=int, default=30, help="Max number of search results/papers to process per query")
     parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to sleep between processing papers (politeness)")
     parser.add_argument("--append", action="store_true", help="Append/update existing JSON instead of overwriting fully")
@@ -868,16 +985,10 @@ def main():
     print("=" * 50)
 
     # Process selected drugs
-    azacitidine_outcomes: List[ClinicalOutcome] = []
-    decitabine_outcomes: List[ClinicalOutcome] = []
-    hydroxyurea_outcomes: List[ClinicalOutcome] = []
-
-    if args.drug in ("azacitidine", "all"):
-        azacitidine_outcomes = extractor.process_drug_research("azacitidine", "hypomethylating", max_results=args.max, per_paper_sleep=args.sleep)
-    if args.drug in ("decitabine", "all"):
-        decitabine_outcomes = extractor.process_drug_research("decitabine", "hypomethylating", max_results=args.max, per_paper_sleep=args.sleep)
-    if args.drug in ("hydroxyurea", "all"):
-        hydroxyurea_outcomes = extractor.process_drug_research("hydroxyurea", "cytoreductive", max_results=args.max, per_paper_sleep=args.sleep)
+    selected_drugs = list(DRUG_TERMS) if args.drug == "all" else [args.drug]
+    outcomes_by_drug: Dict[str, List[ClinicalOutcome]] = {drug: [] for drug in DRUG_TERMS}
+    for drug in selected_drugs:
+        outcomes_by_drug[drug] = extractor.process_drug_research(drug, DRUG_TERMS[drug], max_results=args.max, per_paper_sleep=args.sleep)
 
     # Load existing JSON if append mode
     output_dir = os.path.dirname(os.path.abspath(__file__))
@@ -885,15 +996,15 @@ def main():
     existing = None
     if args.append and os.path.exists(output_file_path):
         try:
-            with open(output_file_path, "r") as rf:
-                existing = json.load(rf)
+            with open(output_file_path, "rb") as rf:
+                existing = orjson.loads(rf.read())
         except Exception:
             existing = None
 
     # Create comparative table if all drugs processed
     if args.drug == "all":
         comparison_df = extractor.create_comparative_table(
-            azacitidine_outcomes, decitabine_outcomes, hydroxyurea_outcomes
+            outcomes_by_drug["azacitidine"], outcomes_by_drug["decitabine"], outcomes_by_drug["hydroxyurea"]
         )
         print("\n" + "=" * 50)
         print("COMPARATIVE RESULTS TABLE")
@@ -911,9 +1022,7 @@ def main():
                 "total_papers_processed": 0,
                 "note": "All data includes direct quotes and source locations for verification"
             },
-            "azacitidine": [],
-            "decitabine": [],
-            "hydroxyurea": []
+            **{drug: [] for drug in DRUG_TERMS}
         }
 
     # Helper to serialize outcomes
@@ -926,53 +1035,24 @@ def main():
             } for o in outcomes
         ]
 
-    if args.drug in ("azacitidine", "all"):
-        results["azacitidine"] = serialize(azacitidine_outcomes) if not args.append else (results.get("azacitidine", []) + serialize(azacitidine_outcomes))
-    if args.drug in ("decitabine", "all"):
-        results["decitabine"] = serialize(decitabine_outcomes) if not args.append else (results.get("decitabine", []) + serialize(decitabine_outcomes))
-    if args.drug in ("hydroxyurea", "all"):
-        results["hydroxyurea"] = serialize(hydroxyurea_outcomes) if not args.append else (results.get("hydroxyurea", []) + serialize(hydroxyurea_outcomes))
+    for drug in selected_drugs:
+        serialized = serialize(outcomes_by_drug[drug])
+        results[drug] = serialized if not args.append else (results.get(drug, []) + serialized)
 
     # Update metadata
-    total = len(results.get("azacitidine", [])) + len(results.get("decitabine", [])) + len(results.get("hydroxyurea", []))
+    total = sum(len(results.get(drug, [])) for drug in DRUG_TERMS)
     results["extraction_metadata"]["extraction_date"] = time.strftime("%Y-%m-%d %H:%M:%S")
     results["extraction_metadata"]["total_papers_processed"] = total
 
-    with open(output_file_path, "w") as f:
-        json.dump(results, f, indent=2, default=str)
-
-    # Attribution file (optional)
-    with open(os.path.join(output_dir, "cmml_attribution_summary.txt"), "w") as f:
-        f.write("CMML CLINICAL DATA - ATTRIBUTION SUMMARY\n")
-        f.write("=" * 50 + "\n\n")
-        for drug_name, outcomes in [("Azacitidine", [ClinicalOutcome(**{k: v for k, v in x.items() if k in ClinicalOutcome().__dict__.keys()}) for x in results.get("azacitidine", [])]),
-                                   ("Decitabine", [ClinicalOutcome(**{k: v for k, v in x.items() if k in ClinicalOutcome().__dict__.keys()}) for x in results.get("decitabine", [])]),
-                                   ("Hydroxyurea", [ClinicalOutcome(**{k: v for k, v in x.items() if k in ClinicalOutcome().__dict__.keys()}) for x in results.get("hydroxyurea", [])])]:
-            f.write(f"{drug_name.upper()}\n")
-            f.write("-" * len(drug_name) + "\n")
-            for i, outcome in enumerate(outcomes, 1):
-                f.write(f"\n{i}. PMID {outcome.pmid}\n")
-                f.write(f"   Citation: {outcome.citation[:100]}...\n")
-                if outcome.key_findings:
-                    f.write(f"   Key Findings: {outcome.key_findings}\n")
-                if outcome.patient_population:
-                    f.write(f"   Patient Population: {outcome.patient_population}\n")
-                if outcome.treatment_details:
-                    f.write(f"   Treatment: {outcome.treatment_details}\n")
-                if outcome.data_source_location:
-                    f.write(f"   Data Location: {outcome.data_source_location}\n")
-                if outcome.complete_response is not None:
-                    f.write(f"   Complete Response: {outcome.complete_response}%\n")
-                if outcome.partial_response is not None:
-                    f.write(f"   Partial Response: {outcome.partial_response}%\n")
-                if outcome.os_median is not None:
-                    f.write(f"   Overall Survival: {outcome.os_median} months\n")
-                if outcome.supporting_quotes:
-                    f.write("   Supporting Quotes:\n")
-                    for quote in outcome.supporting_quotes[:2]:
-                        f.write(f"     - \"{str(quote)[:100]}...\"\n")
-                f.write(f"   URL: {outcome.url}\n")
-            f.write("\n" + "=" * 50 + "\n")
+    # The JSON dump and the attribution summary only read results, so write them side by side
+    attribution_path = os.path.join(output_dir, "cmml_attribution_summary.txt")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(write_results_json, output_file_path, results),
+            executor.submit(write_attribution_summary, attribution_path, results)
+        ]
+        for future in futures:
+            future.result()
 
     print("\nSaved:")
     if args.drug == "all":
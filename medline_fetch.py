@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Batched, rate-limited efetch of PubMed MEDLINE records
+Shared by the hydroxyurea fetch scripts; records go through pubmed_cache (ext='medline')
+"""
+
+import asyncio
+import aiohttp
+from typing import Dict, List, Optional, Tuple
+import pubmed_cache
+from rate_limiter import AsyncRateLimiter
+from eutils_session import NCBI_API_KEY
+
+EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+
+MAX_RETRIES = 4
+
+# efetch takes up to 200 comma-separated ids and returns the records back to back
+MEDLINE_BATCH_SIZE = 200
+
+async def fetch_medline(session: aiohttp.ClientSession, rate_limiter: AsyncRateLimiter,
+                        semaphore: asyncio.Semaphore, pmids: List[str]) -> Optional[str]:
+    """Fetch the MEDLINE records for a batch of PMIDs, backing off on 429/5xx as NCBI asks"""
+    params = {
+        'db': 'pubmed',
+        'id': ','.join(pmids),
+        'retmode': 'text',
+        'rettype': 'medline'
+    }
+    # aiohttp rejects None-valued params, so the key is only added when set
+    if NCBI_API_KEY:
+        params['api_key'] = NCBI_API_KEY
+
+    for attempt in range(MAX_RETRIES):
+        async with semaphore:
+            await rate_limiter.acquire()
+            async with session.get(EFETCH_URL, params=params) as response:
+                if response.status == 200:
+                    if response.headers.get('X-RateLimit-Remaining') == '0':
+                        # Quota for this window is used up; let it roll over
+                        await asyncio.sleep(1)
+                    return await response.text()
+                if response.status != 429 and response.status < 500:
+                    print(f"Failed to fetch abstracts for batch starting at PMID {pmids[0]}: HTTP {response.status}")
+                    return None
+                retry_after = response.headers.get('Retry-After', '')
+
+        # Honour Retry-After when given, otherwise back off exponentially
+        delay = int(retry_after) if retry_after.isdigit() else 2 ** attempt
+        print(f"HTTP {response.status} for batch starting at PMID {pmids[0]}, retrying in {delay}s")
+        await asyncio.sleep(delay)
+
+    print(f"Failed to fetch abstracts for batch starting at PMID {pmids[0]} after {MAX_RETRIES} attempts")
+    return None
+
+def parse_abstract(record: str) -> Optional[str]:
+    """Return the AB field of a MEDLINE record with whitespace collapsed, or None"""
+    # MEDLINE is line-oriented: a field starts with a padded "XXXX- " tag and
+    # continues on lines indented by six spaces, so a plain scan finds its end
+    words = []
+    in_ab = False
+    for line in record.splitlines():
+        if line.startswith('AB  - '):
+            in_ab = True
+            words.extend(line[6:].split())
+        elif in_ab:
+            if not line.startswith('      '):
+                break
+            words.extend(line.split())
+    return ' '.join(words) if words else None
+
+def split_medline(text: str) -> Dict[str, str]:
+    """Split a multi-record MEDLINE response into {pmid: record}"""
+    # Every record starts with a "PMID- " line, so a plain split is linear in the response size
+    records = {}
+    for record in ('\n' + text).split('\nPMID- ')[1:]:
+        pmid = record.split('\n', 1)[0].strip()
+        if pmid.isdigit():
+            records[pmid] = 'PMID- ' + record
+    return records
+
+def cached_records(pmids: List[str]) -> Tuple[Dict[str, str], List[str]]:
+    """Split pmids into MEDLINE records from the disk cache and PMIDs that still need fetching"""
+    records = {}
+    missing = []
+    for pmid in pmids:
+        record = pubmed_cache.get(pmid, 'medline')
+        if record is None:
+            missing.append(pmid)
+        else:
+            records[pmid] = record.decode()
+    return records, missing
+
+async def fetch_medline_batch(session: aiohttp.ClientSession, rate_limiter: AsyncRateLimiter,
+                              semaphore: asyncio.Semaphore, pmids: List[str]) -> Dict[str, str]:
+    """Fetch one efetch batch and return its records keyed by PMID"""
+    try:
+        text = await fetch_medline(session, rate_limiter, semaphore, pmids)
+    except Exception as e:
+        print(f"Could not fetch abstracts for batch starting at PMID {pmids[0]}: {e}")
+        return {}
+    if text is None:
+        return {}
+    records = split_medline(text)
+    # Reruns read these from disk instead of hitting efetch again
+    for pmid, record in records.items():
+        pubmed_cache.set(pmid, record.encode(), 'medline')
+    return records
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Reduce the mixed-format efficacy values in the extracted data to a single float
+"""
+
+def _from_number(value):
+    return float(value)
+
+def _from_str(value):
+    try:
+        return float(value.replace('%', ''))
+    except ValueError:
+        return None
+
+def _mean_of_numbers(values):
+    numbers = [v for v in values if type(v) in (int, float)]
+    return sum(numbers) / len(numbers) if numbers else None
+
+def _from_dict(value):
+    # For cases like {'DEC-C': 64.0, 'DEC-C-Ven': 90.0} take the average of all numeric values
+    return _mean_of_numbers(value.values())
+
+def _from_list(value):
+    return _mean_of_numbers(value)
+
+# One dict lookup on the exact type instead of a cascade of isinstance checks
+_DISPATCH = {
+    int: _from_number,
+    float: _from_number,
+    str: _from_str,
+    dict: _from_dict,
+    list: _from_list
+}
+
+def extract_numeric_value(value):
+    """Extract a single numeric value from a number, percentage string, dict or list, or None"""
+    extract = _DISPATCH.get(type(value))
+    return extract(value) if extract else None
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of PubMed efetch records keyed by PMID
+Each <PubmedArticle> is stored as raw XML (or a MEDLINE text record, ext='medline')
+so every fetcher can parse it its own way
+"""
+
+import os
+import tempfile
+import time
+from typing import Optional
+
+CACHE_DIR = 'pubmed_cache'
+
+# Entries older than this are refetched so corrections and new PMC links are picked up
+TTL_SECONDS = 30 * 24 * 3600
+
+def _cache_path(pmid: str, ext: str) -> str:
+    return os.path.join(CACHE_DIR, f"{pmid}.{ext}")
+
+def get(pmid: str, ext: str = 'xml') -> Optional[bytes]:
+    """Return the cached <PubmedArticle> XML for `pmid`, or None on a miss or expired entry"""
+    path = _cache_path(pmid, ext)
+    try:
+        if time.time() - os.path.getmtime(path) > TTL_SECONDS:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def set(pmid: str, xml: bytes, ext: str = 'xml'):
+    """Store the <PubmedArticle> XML for `pmid`"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # A unique temp file per writer, since concurrent fetches can store the same PMID;
+    # the atomic rename means an interrupted run never leaves a half-written entry
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix='.tmp', delete=False) as f:
+        f.write(xml)
+    try:
+        os.replace(f.name, _cache_path(pmid, ext))
+    except OSError:
+        os.unlink(f.name)
+        raise
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Token-bucket rate limiters shared by the fetch and extraction scripts
+RateLimiter blocks the calling thread; AsyncRateLimiter is for asyncio code
+"""
+
+import asyncio
+import time
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per `period` seconds.
+
+    Time spent waiting on the previous request counts towards the refill,
+    so a slow call is not followed by a full fixed-length sleep.
+    """
+
+    def __init__(self, rate: float, period: float, burst: int = 1):
+        self.fill_rate = rate / period
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _take(self) -> float:
+        """Refill, then take a token and return 0, or return how long to wait for one"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.fill_rate
+
+    def acquire(self):
+        while (delay := self._take()) > 0:
+            time.sleep(delay)
+
+class AsyncRateLimiter(RateLimiter):
+    """Asyncio token bucket allowing `rate` calls per `period` seconds"""
+
+    def __init__(self, rate: float, period: float, burst: int = 1):
+        super().__init__(rate, period, burst)
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while (delay := self._take()) > 0:
+                await asyncio.sleep(delay)